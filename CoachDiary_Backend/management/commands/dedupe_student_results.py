@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from standards.models import StudentStandard
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет повторяющиеся результаты учеников (один ученик, норматив и уровень) '
+        'перед добавлением ограничения unique_student_standard_level'
+    )
+
+    def handle(self, *args, **options):
+        table = StudentStandard._meta.db_table
+
+        if table not in connection.introspection.table_names():
+            self.stdout.write('Таблица результатов еще не создана, удалять нечего')
+            return
+
+        # Из каждой группы остается одна запись: сначала неудаленные, среди них -
+        # с заполненным значением, затем самая поздняя по дате записи и id
+        with transaction.atomic(), connection.cursor() as cursor:
+            quoted = connection.ops.quote_name(table)
+            cursor.execute(
+                f'DELETE FROM {quoted} r USING ('
+                ' SELECT id, row_number() OVER ('
+                '  PARTITION BY student_id, standard_id, level_id'
+                '  ORDER BY (deleted_at IS NULL) DESC, (value IS NOT NULL) DESC, date_recorded DESC, id DESC'
+                ' ) AS position'
+                f' FROM {quoted}'
+                ' WHERE level_id IS NOT NULL'
+                ') duplicates '
+                'WHERE r.id = duplicates.id AND duplicates.position > 1'
+            )
+            deleted = cursor.rowcount
+
+        self.stdout.write(self.style.SUCCESS(f'Удалено повторяющихся результатов: {deleted}'))
@@ -0,0 +1,14 @@
+import os
+from dotenv import load_dotenv
+
+load_dotenv()
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.redis.RedisCache",
+        "LOCATION": os.environ.get(
+            "CACHE_URL",
+            f"redis://{os.getenv('REDIS_HOST', 'localhost')}:6379/2",
+        ),
+    }
+}
@@ -15,4 +15,11 @@ CELERY_RESULT_BACKEND = os.environ.get(
 CELERY_ACCEPT_CONTENT = ['json']
 CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
-CELERY_TIMEZONE = 'UTC'
\ No newline at end of file
+CELERY_TIMEZONE = 'UTC'
+
+CELERY_BEAT_SCHEDULE = {
+    'delete-expired-jobs': {
+        'task': 'users.tasks.delete_expired_jobs_task',
+        'schedule': 60 * 60,
+    },
+}
@@ -0,0 +1,19 @@
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Количество классов, импортируемых в одной транзакции
+TEACHER_IMPORT_BATCH_SIZE = int(os.getenv('TEACHER_IMPORT_BATCH_SIZE', 20))
+
+# Каталог для загруженных файлов и результатов фоновых задач импорта/экспорта.
+# По умолчанию - var/jobs в корне проекта, вне пакета с исходным кодом
+JOB_FILES_ROOT = os.getenv('JOB_FILES_ROOT', os.path.join(Path(__file__).resolve().parent.parent.parent, 'var', 'jobs'))
+
+# Через сколько дней завершенные фоновые задачи удаляются вместе с их файлами
+JOB_RETENTION_DAYS = int(os.getenv('JOB_RETENTION_DAYS', 7))
+
+# Каталог для кэша файлов экспорта, привязанных к версии данных преподавателя
+EXPORT_CACHE_ROOT = os.getenv('EXPORT_CACHE_ROOT', os.path.join(JOB_FILES_ROOT, 'export_cache'))
@@ -0,0 +1,8 @@
+import os
+
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Количество процессов для параллельной отрисовки QR-кодов в фоновых задачах
+QR_CODES_WORKERS = int(os.getenv('QR_CODES_WORKERS', os.cpu_count() or 1))
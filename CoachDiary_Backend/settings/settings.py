@@ -6,4 +6,7 @@ from .locale import *  # noqa
 from .middleware import *  # noqa
 from .rest_framework import *  # noqa
 from .auth import *  # noqa
-from .celery import *  # noqa
\ No newline at end of file
+from .celery import *  # noqa
+from .cache import *  # noqa
+from .import_export import *  # noqa
+from .qr_codes import *  # noqa
\ No newline at end of file
@@ -0,0 +1,42 @@
+import threading
+from contextlib import contextmanager
+
+_state = threading.local()
+
+
+@contextmanager
+def bulk_signals():
+    """
+    Контекст для массовых операций.
+
+    Пока контекст активен, обработчики сигналов не выполняют работу для каждого
+    объекта, а через defer_to_bulk откладывают объекты в очередь. При выходе
+    из контекста каждый отложенный обработчик вызывается один раз со списком
+    всех накопленных объектов. Вложенные контексты объединяются с внешним.
+    """
+    if getattr(_state, 'pending', None) is not None:
+        yield
+        return
+
+    _state.pending = pending = {}
+    try:
+        yield
+    finally:
+        _state.pending = None
+
+    for handler, items in pending.items():
+        handler(list(items.values()))
+
+
+def defer_to_bulk(handler, key, item):
+    """
+    Откладывает item для пакетного обработчика handler, если активен bulk_signals.
+    Повторные объекты с тем же key игнорируются.
+    Возвращает True, если объект отложен, и False, если обработку нужно выполнить сразу.
+    """
+    pending = getattr(_state, 'pending', None)
+    if pending is None:
+        return False
+
+    pending.setdefault(handler, {}).setdefault(key, item)
+    return True
@@ -35,19 +35,22 @@ def create_excel_formats(workbook):
     return formats
 
 
-def write_headers_and_data(worksheet, df, formats, gender_col=None):
-    """Общий метод для записи заголовков и данных таблицы с форматированием."""
-    for col_num, value in enumerate(df.columns.values):
+def write_headers(worksheet, columns, formats):
+    """Записывает строку заголовков таблицы."""
+    for col_num, value in enumerate(columns):
         worksheet.write(0, col_num, value, formats['header'])
 
-    for row_num in range(len(df)):
-        is_gray_row = row_num % 2 == 1
-        row_format = formats['gray_cell'] if is_gray_row else formats['cell']
 
-        for col_num, value in enumerate(df.iloc[row_num]):
-            if gender_col is not None and col_num == gender_col:
-                gender = df.iloc[row_num, gender_col] == 'м'
-                gender_format = formats['boy'] if gender else formats['girl']
-                worksheet.write(row_num + 1, col_num, value, gender_format)
-            else:
-                worksheet.write(row_num + 1, col_num, value, row_format)
+def write_data_row(worksheet, row_num, values, formats, gender_col=None):
+    """
+    Записывает строку данных с форматированием.
+    Строки чередуют фон, ячейка пола окрашивается по значению ('м' или 'ж').
+    """
+    row_format = formats['gray_cell'] if row_num % 2 == 0 else formats['cell']
+
+    for col_num, value in enumerate(values):
+        if col_num == gender_col:
+            cell_format = formats['boy'] if value == 'м' else formats['girl']
+        else:
+            cell_format = row_format
+        worksheet.write(row_num, col_num, value, cell_format)
@@ -0,0 +1,70 @@
+import functools
+
+from django.core.cache import cache
+from rest_framework import status
+from rest_framework.response import Response
+
+IDEMPOTENCY_HEADER = 'Idempotency-Key'
+IDEMPOTENCY_CACHE_KEY = "idempotency:{user_id}:{view}:{key}"
+IDEMPOTENCY_CACHE_TIMEOUT = 60 * 60 * 24
+IDEMPOTENCY_LOCK_TIMEOUT = 60 * 5
+IDEMPOTENCY_KEY_MAX_LENGTH = 255
+
+_IN_PROGRESS = 'in_progress'
+
+
+def idempotent(view_method):
+    """
+    Делает метод представления идемпотентным по заголовку Idempotency-Key.
+
+    Ответ на первый запрос с ключом сохраняется в кэше на сутки, повторные запросы
+    того же пользователя с тем же ключом получают сохраненный ответ без повторного
+    выполнения. Пока первый запрос выполняется, повторные получают 409.
+    Запросы без заголовка обрабатываются как обычно.
+    """
+
+    @functools.wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key = request.headers.get(IDEMPOTENCY_HEADER)
+        if not key:
+            return view_method(self, request, *args, **kwargs)
+
+        if len(key) > IDEMPOTENCY_KEY_MAX_LENGTH:
+            return Response(
+                {"error": f"Длина {IDEMPOTENCY_HEADER} не должна превышать {IDEMPOTENCY_KEY_MAX_LENGTH} символов."},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        cache_key = IDEMPOTENCY_CACHE_KEY.format(
+            user_id=request.user.id,
+            view=f'{type(self).__name__}.{view_method.__name__}',
+            key=key,
+        )
+
+        if not cache.add(cache_key, _IN_PROGRESS, IDEMPOTENCY_LOCK_TIMEOUT):
+            saved = cache.get(cache_key)
+            if saved is None or saved == _IN_PROGRESS:
+                return Response(
+                    {"error": "Запрос с этим ключом идемпотентности еще выполняется."},
+                    status=status.HTTP_409_CONFLICT
+                )
+            return Response(saved['data'], status=saved['status'])
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except BaseException:
+            cache.delete(cache_key)
+            raise
+
+        if response.status_code >= 500:
+            cache.delete(cache_key)
+        else:
+            cache.set(
+                cache_key,
+                {'data': response.data, 'status': response.status_code},
+                IDEMPOTENCY_CACHE_TIMEOUT
+            )
+
+        return response
+
+    return wrapper
@@ -0,0 +1,140 @@
+import codecs
+import json
+import re
+
+READ_CHUNK_SIZE = 64 * 1024
+MAX_ITEM_SIZE = 64 * 1024 * 1024
+
+# Ошибка разбора ближе этого числа символов к концу буфера может означать, что значение просто не дочитано
+_INCOMPLETE_TAIL = 16
+
+_WHITESPACE = re.compile(r'\s*')
+
+
+class JSONStreamError(ValueError):
+    """Некорректный JSON во входном потоке"""
+
+
+class _Reader:
+    """Буфер над бинарным потоком, декодирующий JSON-значения по мере чтения."""
+
+    def __init__(self, stream, chunk_size, max_item_size):
+        self._stream = stream
+        self._chunk_size = chunk_size
+        self._max_item_size = max_item_size
+        self._text_decoder = codecs.getincrementaldecoder('utf-8')()
+        self._json_decoder = json.JSONDecoder()
+        self._buffer = ''
+        self._pos = 0
+        self._eof = False
+
+    def _fill(self, size=None):
+        if self._eof:
+            return False
+
+        chunk = self._stream.read(size or self._chunk_size)
+        try:
+            text = self._text_decoder.decode(chunk, final=not chunk)
+        except UnicodeDecodeError as e:
+            raise JSONStreamError(str(e)) from e
+
+        if not chunk:
+            self._eof = True
+        self._buffer = self._buffer[self._pos:] + text
+        self._pos = 0
+        return True
+
+    def peek(self):
+        """Возвращает следующий значимый символ, не забирая его. Пустая строка — конец потока."""
+        while True:
+            self._pos = _WHITESPACE.match(self._buffer, self._pos).end()
+            if self._pos < len(self._buffer):
+                return self._buffer[self._pos]
+            if not self._fill():
+                return ''
+
+    def expect(self, char):
+        found = self.peek()
+        if found != char:
+            raise JSONStreamError(f'Ожидался символ {char!r}, получено {found or "конец файла"!r}')
+        self._pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self._json_decoder.raw_decode(self._buffer, self._pos)
+            except json.JSONDecodeError as e:
+                if self._is_incomplete(e) and self._grow():
+                    continue
+                raise JSONStreamError(str(e)) from e
+
+            # Число у конца буфера могло быть обрезано — дочитываем и разбираем заново
+            if len(self._buffer) - end < _INCOMPLETE_TAIL and self._grow():
+                continue
+
+            self._pos = end
+            return value
+
+    def _is_incomplete(self, error):
+        """Ошибка вызвана концом буфера, а не некорректными данными"""
+        return error.pos >= len(self._buffer) - _INCOMPLETE_TAIL or error.msg.startswith('Unterminated string')
+
+    def _grow(self):
+        """
+        Дочитывает поток так, чтобы недоразобранная часть буфера выросла примерно вдвое.
+        Поэтому значение разбирается заново O(log n) раз, а не на каждые chunk_size байт.
+        """
+        pending = len(self._buffer) - self._pos
+        if pending >= self._max_item_size:
+            raise JSONStreamError(f'Размер элемента превышает {self._max_item_size} символов')
+        return self._fill(max(self._chunk_size, pending))
+
+
+def iter_json_object(stream, chunk_size=READ_CHUNK_SIZE, max_item_size=MAX_ITEM_SIZE):
+    """
+    Последовательно разбирает JSON-объект верхнего уровня из бинарного потока.
+
+    Выдает события:
+        ('key', имя) — начало значения с указанным ключом;
+        ('item', значение) — очередной элемент, если значение ключа — массив;
+        ('value', значение) — значение ключа, если это не массив.
+
+    В памяти одновременно находится только текущий элемент массива,
+    поэтому большие файлы можно обрабатывать частями. Элемент длиннее
+    max_item_size символов считается ошибкой.
+    """
+    reader = _Reader(stream, chunk_size, max_item_size)
+    reader.expect('{')
+
+    if reader.peek() == '}':
+        reader.expect('}')
+    else:
+        while True:
+            key = reader.value()
+            if not isinstance(key, str):
+                raise JSONStreamError('Ключ объекта должен быть строкой')
+            reader.expect(':')
+            yield 'key', key
+
+            if reader.peek() == '[':
+                reader.expect('[')
+                if reader.peek() == ']':
+                    reader.expect(']')
+                else:
+                    while True:
+                        yield 'item', reader.value()
+                        if reader.peek() != ',':
+                            break
+                        reader.expect(',')
+                    reader.expect(']')
+            else:
+                yield 'value', reader.value()
+
+            if reader.peek() != ',':
+                break
+            reader.expect(',')
+        reader.expect('}')
+
+    if reader.peek():
+        raise JSONStreamError('Лишние данные после JSON-объекта')
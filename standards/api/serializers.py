@@ -1,7 +1,9 @@
 from rest_framework import serializers
 
+from standards.grading import get_grading_rules, invalidate_grading_rules
 from students.api.serializers import FullClassNameSerializer
 from students.models import Student
+from users.export_cache import bump_data_version
 from .. import models
 
 
@@ -72,23 +74,44 @@ class StandardSerializer(serializers.ModelSerializer):
 
     def update(self, instance, validated_data):
         levels_data = validated_data.pop('levels', [])
+        has_numeric_value_changed = (
+            'has_numeric_value' in validated_data
+            and validated_data['has_numeric_value'] != instance.has_numeric_value
+        )
         instance.name = validated_data.get('name', instance.name)
         instance.has_numeric_value = validated_data.get('has_numeric_value', instance.has_numeric_value)
         instance.save()
 
         existing_levels = {level.id: level for level in instance.levels.all()}
+        existing_levels_by_key = {
+            (level.level_number, level.gender): level for level in existing_levels.values()
+        }
         new_levels = []
+        self.changed_level_ids = []
 
         for single_level_data in levels_data:
             level_id = single_level_data.get('id')
+            if not level_id:
+                # id уровня доступен только для чтения, поэтому уровни сопоставляются по номеру и полу
+                level = existing_levels_by_key.get(
+                    (single_level_data.get('level_number'), single_level_data.get('gender'))
+                )
+                level_id = level.id if level else None
+
             if level_id and level_id in existing_levels:
                 level = existing_levels.pop(level_id)
+                old_thresholds = (level.low_value, level.middle_value, level.high_value, level.is_lower_better)
                 level.level_number = single_level_data.get('level_number', level.level_number)
                 level.low_value = single_level_data.get('low_value', level.low_value)
                 level.middle_value = single_level_data.get('middle_value', level.middle_value)
                 level.high_value = single_level_data.get('high_value', level.high_value)
+                level.is_lower_better = single_level_data.get('is_lower_better', level.is_lower_better)
                 level.gender = single_level_data.get('gender', level.gender)
                 level.save()
+
+                new_thresholds = (level.low_value, level.middle_value, level.high_value, level.is_lower_better)
+                if has_numeric_value_changed or new_thresholds != old_thresholds:
+                    self.changed_level_ids.append(level.id)
             else:
                 new_levels.append(models.Level(standard=instance, **single_level_data))
 
@@ -96,6 +119,7 @@ class StandardSerializer(serializers.ModelSerializer):
             level.delete()
 
         models.Level.objects.bulk_create(new_levels)
+        invalidate_grading_rules(instance.who_added_id)
 
         return instance
 
@@ -130,44 +154,37 @@ class StudentResultSerializer(serializers.ModelSerializer):
                  'average_value', 'average_grade', 'standards_details']
 
     def to_representation(self, instance):
+        """
+        Результаты берутся из context['results_by_student'], заранее
+        сгруппированных по ученику: {student_id: {standard_id: (value, grade)}}.
+        """
         representation = super().to_representation(instance)
         standard_ids = self.context.get('standard_ids', [])
 
         if standard_ids:
-            values = []
-            grades = []
+            student_results = self.context.get('results_by_student', {}).get(instance.id, {})
+            values_sum, values_count = 0, 0
+            grades_sum, grades_count = 0, 0
             standards_details = []
 
             for standard_id in standard_ids:
-                try:
-                    student_standard = instance.standards.get(
-                        standard_id=standard_id,
-                        level__level_number=instance.student_class.number,
-                        level__gender=instance.gender
-                    )
-
-                    standard_detail = {
-                        'standard_id': int(standard_id),
-                        'value': student_standard.value,
-                        'grade': student_standard.grade
-                    }
-
-                    if student_standard.value is not None:
-                        values.append(student_standard.value)
-                    if student_standard.grade is not None:
-                        grades.append(student_standard.grade)
-
-                except:
-                    standard_detail = {
-                        'standard_id': int(standard_id),
-                        'value': None,
-                        'grade': None
-                    }
-
-                standards_details.append(standard_detail)
-
-            representation['average_value'] = sum(values) / len(values) if values else None
-            representation['average_grade'] = sum(grades) / len(grades) if grades else None
+                value, grade = student_results.get(int(standard_id), (None, None))
+
+                if value is not None:
+                    values_sum += value
+                    values_count += 1
+                if grade is not None:
+                    grades_sum += grade
+                    grades_count += 1
+
+                standards_details.append({
+                    'standard_id': int(standard_id),
+                    'value': value,
+                    'grade': grade
+                })
+
+            representation['average_value'] = values_sum / values_count if values_count else None
+            representation['average_grade'] = grades_sum / grades_count if grades_count else None
             representation['standards_details'] = standards_details
 
         return representation
@@ -189,34 +206,24 @@ class StudentStandardCreateSerializer(serializers.ModelSerializer):
         value = data.get('value')
         level_number = data.get('level_number')
 
-        try:
-            student = Student.objects.get(id=student_id)
-        except Student.DoesNotExist:
+        student = self._get_student(student_id)
+        if student is None:
             raise serializers.ValidationError("Student does not exist")
 
-        try:
-            standard = models.Standard.objects.get(id=standard_id)
-        except models.Standard.DoesNotExist:
+        standard = self._get_standard(standard_id)
+        if standard is None:
             raise serializers.ValidationError("Standard does not exist")
 
+        rules = self.context.get('grading_rules') or get_grading_rules(standard.who_added_id)
+
         if level_number is not None:
-            try:
-                level = models.Level.objects.get(
-                    level_number=level_number,
-                    standard=standard,
-                    gender=student.gender
-                )
-            except models.Level.DoesNotExist:
+            level = rules.get(standard.id, level_number, student.gender)
+            if level is None:
                 raise serializers.ValidationError(
                     "Invalid level for the provided level number and student's gender")
         else:
-            try:
-                level = models.Level.objects.get(
-                    level_number=student.student_class.number,
-                    standard=standard,
-                    gender=student.gender
-                )
-            except models.Level.DoesNotExist:
+            level = rules.get(standard.id, student.student_class.number, student.gender)
+            if level is None:
                 raise serializers.ValidationError("Invalid level for the student's class")
 
         data['student'] = student
@@ -225,17 +232,31 @@ class StudentStandardCreateSerializer(serializers.ModelSerializer):
 
         return data
 
+    def _get_student(self, student_id):
+        """Берет ученика из заранее загруженных в контекст, иначе из базы данных."""
+        if 'students' in self.context:
+            return self.context['students'].get(student_id)
+        return Student.objects.select_related('student_class').filter(id=student_id).first()
+
+    def _get_standard(self, standard_id):
+        """Берет норматив из заранее загруженных в контекст, иначе из базы данных."""
+        if 'standards' in self.context:
+            return self.context['standards'].get(standard_id)
+        return models.Standard.objects.filter(id=standard_id).first()
+
     def create(self, validated_data):
         level = validated_data['level']
+        value = validated_data.get('value')
 
-        student_standard, created = models.StudentStandard.objects.update_or_create(
+        student_standard = models.StudentStandard(
             student=validated_data['student'],
             standard=validated_data['standard'],
             level=level,
-            defaults={
-                'value': validated_data['value'],
-            }
+            value=value,
+            grade=level.calculate_grade(value),
         )
+        models.StudentStandard.objects.upsert([student_standard])
+        bump_data_version(validated_data['standard'].who_added_id)
         return student_standard
 
 
@@ -260,3 +281,12 @@ class StudentStandardItemSerializer(serializers.ModelSerializer):
 class StudentStandardsResponseSerializer(serializers.Serializer):
     standards = StudentStandardItemSerializer(many=True)
     summary_grade = serializers.FloatField()
+
+
+class LevelSummarySerializer(serializers.Serializer):
+    level_number = serializers.IntegerField()
+    summary_grade = serializers.FloatField()
+
+
+class StudentLevelsSummaryResponseSerializer(serializers.Serializer):
+    levels = LevelSummarySerializer(many=True)
@@ -12,6 +12,8 @@ standards_router.register(r'students/results/list', views.StudentsResultsViewSet
 
 standards_router.register(r'students/results/create', views.StudentResultsCreateOrUpdateViewSet,
                           basename='students-results-create')
+standards_router.register(r'students/results/upload', views.StudentResultsUploadViewSet,
+                          basename='students-results-upload')
 
 urlpatterns = [
     path("", include(standards_router.urls)),
@@ -1,4 +1,9 @@
+import uuid
+
+from celery.result import AsyncResult
+from django.core.cache import cache
 from django.db import transaction
+from django.db.models import Avg, F
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiParameter
 from rest_framework import mixins, viewsets, status
@@ -7,11 +12,20 @@ from rest_framework.exceptions import PermissionDenied
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 
+from common.bulk_signals import bulk_signals
+from common.idempotency import idempotent
 from common.permissions import IsTeacher
 from standards import models
+from standards.grading import GradingRules, invalidate_grading_rules
+from standards.tasks import regrade_levels_task
 from students.models import Student
+from users.export_cache import bump_data_version
 from .serializers import StudentResultSerializer, StandardSerializer, StudentStandardCreateSerializer, \
-    StudentStandardsResponseSerializer
+    StudentStandardsResponseSerializer, StudentLevelsSummaryResponseSerializer
+
+# Владелец задачи пересчета оценок, хранится столько же, сколько результат задачи в Celery
+REGRADE_TASK_OWNER_CACHE_KEY = "regrade_task_owner:{task_id}"
+REGRADE_TASK_OWNER_CACHE_TIMEOUT = 60 * 60 * 24
 
 
 class StandardValueViewSet(
@@ -26,6 +40,7 @@ class StandardValueViewSet(
     permission_classes = (
         IsTeacher,
     )
+    regrade_task_id = None
 
     @extend_schema(
         summary="Список всех нормативов текущего пользователя",
@@ -43,10 +58,15 @@ class StandardValueViewSet(
 
     @extend_schema(
         summary="Полное обновление норматива",
-        description="Обновляет все поля норматива, включая уровни и их значения."
+        description="Обновляет все поля норматива, включая уровни и их значения. "
+                    "Если значения уровней изменились, оценки учеников пересчитываются в фоне, "
+                    "а в ответ добавляется regrade_task_id для отслеживания прогресса."
     )
     def update(self, request, *args, **kwargs):
-        return super().update(request, *args, **kwargs)
+        response = super().update(request, *args, **kwargs)
+        if self.regrade_task_id:
+            response.data['regrade_task_id'] = self.regrade_task_id
+        return response
 
     @extend_schema(
         summary="Частичное обновление норматива",
@@ -98,6 +118,7 @@ class StandardValueViewSet(
         if levels_to_delete.exists():
             deleted_count = levels_to_delete.count()
             levels_to_delete.delete()
+            invalidate_grading_rules(standard.who_added_id)
             return Response(
                 {"detail": f"Удалено уровней: {deleted_count}"},
                 status=status.HTTP_204_NO_CONTENT
@@ -108,11 +129,53 @@ class StandardValueViewSet(
                 status=status.HTTP_404_NOT_FOUND
             )
 
+    @extend_schema(
+        summary="Прогресс пересчета оценок",
+        description="Возвращает состояние фоновой задачи пересчета оценок после изменения значений уровней",
+        parameters=[
+            OpenApiParameter(
+                name='task_id',
+                type=OpenApiTypes.STR,
+                location='query',
+                description='Идентификатор задачи (regrade_task_id из ответа на обновление норматива)',
+                required=True
+            ),
+        ]
+    )
+    @action(detail=False, methods=['get'])
+    def regrade_status(self, request):
+        task_id = request.query_params.get('task_id')
+        if not task_id:
+            return Response(
+                {"detail": "Необходимо указать параметр task_id"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        if cache.get(REGRADE_TASK_OWNER_CACHE_KEY.format(task_id=task_id)) != request.user.id:
+            return Response(
+                {"detail": "Задача пересчета оценок не найдена"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        result = AsyncResult(task_id)
+        progress = result.info if isinstance(result.info, dict) else {}
+        return Response({
+            "task_id": task_id,
+            "state": result.state,
+            "processed": progress.get('processed'),
+            "total": progress.get('total'),
+            "updated": progress.get('updated'),
+        })
+
     def get_queryset(self):
         user = self.request.user
         return models.Standard.objects.filter(who_added_id=user.id)
 
     def perform_create(self, serializer):
+        with transaction.atomic(), bulk_signals():
+            return self._create_or_extend_standard(serializer)
+
+    def _create_or_extend_standard(self, serializer):
         standard_data = serializer.validated_data
         standard_name = standard_data.get('name')
 
@@ -140,23 +203,24 @@ class StandardValueViewSet(
 
     def perform_update(self, serializer):
         """
-        Метод обновления норматива для сохранения связей с результатами студентов
+        Метод обновления норматива для сохранения связей с результатами студентов.
+        Оценки по уровням с измененными значениями пересчитываются в фоновой задаче.
         """
         with transaction.atomic():
-            instance = self.get_object()
-            old_name = instance.name
-            new_name = serializer.validated_data.get('name', old_name)
-
-            if hasattr(models, 'StudentStandard'):
-                related_records = list(models.StudentStandard.objects.filter(standard=instance))
-            else:
-                related_records = []
-
             updated_standard = serializer.save()
 
-            for record in related_records:
-                record.standard = updated_standard
-                record.save()
+            changed_level_ids = getattr(serializer, 'changed_level_ids', [])
+            if changed_level_ids:
+                self.regrade_task_id = str(uuid.uuid4())
+                cache.set(
+                    REGRADE_TASK_OWNER_CACHE_KEY.format(task_id=self.regrade_task_id),
+                    self.request.user.id,
+                    REGRADE_TASK_OWNER_CACHE_TIMEOUT,
+                )
+                transaction.on_commit(lambda: regrade_levels_task.apply_async(
+                    args=[changed_level_ids],
+                    task_id=self.regrade_task_id,
+                ))
 
             return updated_standard
 
@@ -171,9 +235,10 @@ class StudentStandardsViewSet(viewsets.ViewSet):
         parameters=[
             OpenApiParameter(
                 name='level_number',
-                type=OpenApiTypes.INT,
+                type=OpenApiTypes.STR,
                 location='query',
-                description='Номер уровня (класса), для которого нужно вывести оценки. По умолчанию - текущий класс ученика',
+                description='Номер уровня (класса), для которого нужно вывести оценки. По умолчанию - текущий класс ученика. '
+                            'Значение all возвращает средние оценки по всем уровням',
                 required=False
             ),
         ]
@@ -201,27 +266,42 @@ class StudentStandardsViewSet(viewsets.ViewSet):
             raise PermissionDenied("У вас нет прав доступа к стандартам студентов.")
 
         level_number = request.query_params.get('level_number')
+        if level_number == 'all':
+            levels_summary = student_standards.filter(
+                level__isnull=False
+            ).values(
+                'level__level_number'
+            ).annotate(
+                summary_grade=Avg('grade')
+            ).order_by('level__level_number')
+
+            serializer = StudentLevelsSummaryResponseSerializer({
+                'levels': [
+                    {
+                        'level_number': row['level__level_number'],
+                        'summary_grade': row['summary_grade'] or 0,
+                    }
+                    for row in levels_summary
+                ]
+            })
+            return Response(serializer.data)
+
         if level_number:
             try:
                 level_number = int(level_number)
             except ValueError:
                 return Response(
-                    {"detail": "Параметр level_number должен быть числом"},
+                    {"detail": "Параметр level_number должен быть числом или all"},
                     status=status.HTTP_400_BAD_REQUEST
                 )
         else:
             level_number = student.student_class.number
 
         filtered_standards = student_standards.filter(level__level_number=level_number)
-
-        if filtered_standards.exists():
-            grades_with_values = [s.grade for s in filtered_standards if s.grade is not None]
-            summary_grade = sum(grades_with_values) / len(grades_with_values) if grades_with_values else 0
-        else:
-            summary_grade = 0
+        summary_grade = filtered_standards.aggregate(summary_grade=Avg('grade'))['summary_grade'] or 0
 
         response_data = {
-            'standards': filtered_standards,
+            'standards': filtered_standards.select_related('standard', 'level'),
             'summary_grade': summary_grade,
             'level_number': level_number
         }
@@ -262,14 +342,32 @@ class StudentsResultsViewSet(mixins.ListModelMixin, viewsets.ViewSet):
             return Response({"detail": "Требуются параметры class_id[] и standard_id[]."},
                             status=status.HTTP_400_BAD_REQUEST)
 
+        try:
+            standard_ids = [int(standard_id) for standard_id in standard_ids]
+        except ValueError:
+            return Response({"detail": "Параметры standard_id[] должны быть числами."},
+                            status=status.HTTP_400_BAD_REQUEST)
+
         students = Student.objects.filter(
             student_class__id__in=class_ids,
             student_class__class_owner=request.user
-        )
+        ).select_related('student_class')
+
+        results = models.StudentStandard.objects.filter(
+            student__in=students,
+            standard_id__in=standard_ids,
+            level__level_number=F('student__student_class__number'),
+            level__gender=F('student__gender'),
+        ).values_list('student_id', 'standard_id', 'value', 'grade')
+
+        results_by_student = {}
+        for student_id, standard_id, value, grade in results:
+            results_by_student.setdefault(student_id, {}).setdefault(standard_id, (value, grade))
+
         serializer = StudentResultSerializer(
             students,
             many=True,
-            context={'standard_ids': standard_ids}
+            context={'standard_ids': standard_ids, 'results_by_student': results_by_student}
         )
 
         return Response(serializer.data)
@@ -281,8 +379,11 @@ class StudentResultsCreateOrUpdateViewSet(viewsets.ViewSet):
     @extend_schema(
         summary="Создание или обновление результатов студентов по нормативам",
         description="Создает или обновляет результаты студентов по нормативам. "
-                    "Ожидается список объектов с полями student_id, standard_id, value, grade и level_number.",
+                    "Ожидается список объектов с полями student_id, standard_id, value, grade и level_number. "
+                    "Повторный запрос с тем же заголовком Idempotency-Key возвращает сохраненный ответ "
+                    "без повторной записи.",
     )
+    @idempotent
     @transaction.atomic
     def create(self, request, *args, **kwargs):
         data = request.data
@@ -290,55 +391,123 @@ class StudentResultsCreateOrUpdateViewSet(viewsets.ViewSet):
         if not isinstance(data, list):
             return Response({"error": "Ожидается список объектов."}, status=status.HTTP_400_BAD_REQUEST)
 
-        response_data = []
+        context = self._preload_context(data)
+
+        existing_values = {}
+        for student_id, standard_id, level_number, value in models.StudentStandard.objects.filter(
+                student_id__in=context['students'].keys(),
+                standard_id__in=context['standards'].keys(),
+                level__isnull=False,
+        ).values_list('student_id', 'standard_id', 'level__level_number', 'value'):
+            existing_values.setdefault((student_id, standard_id, level_number), value)
+
+        results = []
         errors = []
 
-        to_update = []
+        to_upsert = {}
 
         for entry in data:
-            serializer = StudentStandardCreateSerializer(data=entry)
+            serializer = StudentStandardCreateSerializer(data=entry, context=context)
             if serializer.is_valid():
                 validated_data = serializer.validated_data
                 student = validated_data['student']
-                student_id = student.id
-                standard_id = validated_data['standard'].id
+                level = validated_data['level']
                 level_number = validated_data.get('level_number', student.student_class.number)
+                key = (student.id, validated_data['standard'].id, level_number)
+
+                if key in existing_values:
+                    if 'value' not in validated_data or validated_data['value'] == existing_values[key]:
+                        continue
+                    detail = "Запись результата студента успешно обновлена. Изменены поля: value"
+                else:
+                    detail = "Запись результата студента успешно создана."
+
+                student_result = to_upsert.get(key) or models.StudentStandard(
+                    student=student,
+                    standard=validated_data['standard'],
+                    level=level,
+                )
+                student_result.value = validated_data.get('value')
+                student_result.grade = level.calculate_grade(student_result.value)
 
-                try:
-                    student_result = models.StudentStandard.objects.select_related('level').get(
-                        student_id=student_id, standard_id=standard_id,
-                        level__level_number=level_number
-                    )
-
-                    has_changes = False
-                    changed_fields = []
-
-                    if 'value' in validated_data and validated_data['value'] != student_result.value:
-                        has_changes = True
-                        changed_fields.append('value')
-
-                    if has_changes:
-                        for field in changed_fields:
-                            setattr(student_result, field, validated_data[field])
-                        to_update.append(student_result)
-                        response_data.append({
-                            "detail": f"Запись результата студента успешно обновлена. Изменены поля: {', '.join(changed_fields)}",
-                            "data": StudentStandardCreateSerializer(instance=student_result).data
-                        })
-                except models.StudentStandard.DoesNotExist:
-                    student_result = serializer.save()
-                    response_data.append({
-                        "detail": "Запись результата студента успешно создана.",
-                        "data": StudentStandardCreateSerializer(instance=student_result).data
-                    })
+                existing_values[key] = student_result.value
+                to_upsert[key] = student_result
+                results.append((detail, student_result))
             else:
                 errors.append(serializer.errors)
 
-        if to_update:
-            for student_result in to_update:
-                student_result.save()
+        if to_upsert:
+            # Запись, созданная параллельным запросом после чтения existing_values, будет обновлена
+            models.StudentStandard.objects.upsert(list(to_upsert.values()))
+            bump_data_version(request.user.id)
+
+        response_data = [
+            {
+                "detail": detail,
+                "data": StudentStandardCreateSerializer(instance=student_result).data
+            }
+            for detail, student_result in results
+        ]
 
         if errors:
             return Response({"errors": errors}, status=status.HTTP_400_BAD_REQUEST)
 
         return Response(response_data, status=status.HTTP_200_OK)
+
+    @staticmethod
+    def _preload_context(data):
+        """
+        Загружает учеников, нормативы и уровни для всех записей запроса.
+        По одному запросу на каждую сущность вместо запросов на каждую запись.
+        """
+        student_ids = set()
+        standard_ids = set()
+        for entry in data:
+            if not isinstance(entry, dict):
+                continue
+            for field, ids in (('student_id', student_ids), ('standard_id', standard_ids)):
+                try:
+                    ids.add(int(entry.get(field)))
+                except (TypeError, ValueError):
+                    continue
+
+        students = Student.objects.select_related('student_class').in_bulk(student_ids)
+        standards = models.Standard.objects.in_bulk(standard_ids)
+        levels = models.Level.objects.filter(standard_id__in=standards.keys()).select_related('standard')
+
+        return {
+            'students': students,
+            'standards': standards,
+            'grading_rules': GradingRules(list(levels)),
+        }
+
+
+class StudentResultsUploadViewSet(viewsets.ViewSet):
+    permission_classes = (IsTeacher,)
+
+    @extend_schema(
+        summary="Загрузка результатов учеников из CSV-файла",
+        description="Принимает CSV-файл (поле file) с колонками student_id, standard_id, value "
+                    "и необязательной level_number. Разделитель - запятая, точка с запятой или табуляция. "
+                    "Оценки рассчитываются по уровням нормативов, существующие результаты обновляются. "
+                    "Строки с пустым value пропускаются и не изменяют сохраненные результаты. "
+                    "Если хотя бы одна строка содержит ошибку, результаты не сохраняются. "
+                    "Повторный запрос с тем же заголовком Idempotency-Key возвращает сохраненный ответ.",
+    )
+    @idempotent
+    def create(self, request, *args, **kwargs):
+        from standards.result_uploads import StudentResultsUploader, ResultsUploadError
+
+        if 'file' not in request.FILES:
+            return Response({"error": "Файл не был предоставлен"}, status=status.HTTP_400_BAD_REQUEST)
+
+        uploaded_file = request.FILES['file']
+        if not uploaded_file.name.lower().endswith('.csv'):
+            return Response({"error": "Файл должен быть в формате CSV"}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            stats = StudentResultsUploader(request.user).run(uploaded_file)
+        except ResultsUploadError as e:
+            return Response({"error": str(e), "errors": e.errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        return Response(stats, status=status.HTTP_200_OK)
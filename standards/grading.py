@@ -0,0 +1,102 @@
+import uuid
+
+import numpy as np
+from django.core.cache import cache
+from django.db import transaction
+
+GRADING_RULES_CACHE_KEY = "grading_rules:{teacher_id}:{version}"
+GRADING_RULES_VERSION_CACHE_KEY = "grading_rules_version:{teacher_id}"
+GRADING_RULES_CACHE_TIMEOUT = 60 * 60 * 24
+
+
+class GradingRules:
+    """
+    Набор уровней нормативов одного преподавателя.
+
+    Уровни индексируются по ключу (standard_id, level_number, gender) и по id,
+    у каждого уровня заранее загружен норматив, поэтому расчет оценки
+    не обращается к базе данных.
+    """
+
+    def __init__(self, levels):
+        self._by_key = {
+            (level.standard_id, level.level_number, level.gender): level
+            for level in levels
+        }
+        self._by_id = {level.id: level for level in levels}
+
+    def get(self, standard_id, level_number, gender):
+        return self._by_key.get((standard_id, level_number, gender))
+
+    def get_by_id(self, level_id):
+        return self._by_id.get(level_id)
+
+
+def _get_rules_version(teacher_id):
+    key = GRADING_RULES_VERSION_CACHE_KEY.format(teacher_id=teacher_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def load_grading_rules(teacher_id):
+    """Загружает уровни нормативов преподавателя из базы данных одним запросом, минуя кэш."""
+    from standards.models import Level
+
+    return list(Level.objects.filter(standard__who_added_id=teacher_id).select_related('standard'))
+
+
+def get_grading_rules(teacher_id):
+    """
+    Возвращает уровни нормативов преподавателя из кэша.
+    При промахе загружает их одним запросом.
+
+    Кэш привязан к версии уровней преподавателя. Версия читается до запроса
+    к базе, поэтому уровни, прочитанные до фиксации изменений, сохраняются
+    под старой версией и после ее смены не используются.
+    """
+    key = GRADING_RULES_CACHE_KEY.format(teacher_id=teacher_id, version=_get_rules_version(teacher_id))
+    levels = cache.get(key)
+
+    if levels is None:
+        levels = load_grading_rules(teacher_id)
+        cache.set(key, levels, GRADING_RULES_CACHE_TIMEOUT)
+
+    return GradingRules(levels)
+
+
+def invalidate_grading_rules(teacher_id):
+    """Меняет версию кэша уровней нормативов преподавателя после фиксации текущей транзакции."""
+    key = GRADING_RULES_VERSION_CACHE_KEY.format(teacher_id=teacher_id)
+    transaction.on_commit(lambda: cache.set(key, uuid.uuid4().hex, None))
+
+
+def calculate_grades(values, low_values, middle_values, high_values, is_lower_better, has_numeric_value=True):
+    """
+    Рассчитывает оценки для массива значений за один проход.
+
+    Аналог Level.calculate_grade: values - массив значений, остальные
+    аргументы - массивы той же длины или скаляры. Для пустых значений
+    возвращается None, для нормативов без числового значения оценкой
+    считается само значение.
+    """
+    values = np.asarray(values, dtype=float)
+    sign = np.where(np.asarray(is_lower_better, dtype=bool), -1.0, 1.0)
+
+    signed_values = values * sign
+    grades = np.select(
+        [
+            signed_values >= np.asarray(high_values, dtype=float) * sign,
+            signed_values >= np.asarray(middle_values, dtype=float) * sign,
+            signed_values >= np.asarray(low_values, dtype=float) * sign,
+        ],
+        [5, 4, 3],
+        default=2,
+    )
+    grades = np.where(np.asarray(has_numeric_value, dtype=bool), grades, np.rint(values))
+
+    grades = grades.astype(object)
+    grades[np.isnan(values)] = None
+    return [None if grade is None else int(grade) for grade in grades]
@@ -4,8 +4,10 @@ from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
 from django.utils import timezone
+from django_softdelete.managers import SoftDeleteManager, SoftDeleteQuerySet
 
 from common.models import AbstractLevel, AbstractStandard, BaseModel
+from standards.grading import calculate_grades, get_grading_rules
 from users.models import User
 
 
@@ -92,6 +94,61 @@ class Level(AbstractLevel):
         return f"Уровень {self.level_number} для {self.standard.name} ({self.get_gender_display()})"
 
 
+UNIQUE_RESULT_FIELDS = ['student', 'standard', 'level']
+
+
+class StudentStandardQuerySet(SoftDeleteQuerySet):
+    def regrade(self, batch_size=1000):
+        """
+        Пересчитывает оценки всех результатов выборки по текущим значениям уровней.
+        Данные читаются одним запросом, изменившиеся оценки записываются через bulk_update.
+        Возвращает количество обновленных записей.
+        """
+        rows = list(self.filter(level__isnull=False).values_list(
+            'id', 'grade', 'value',
+            'level__low_value', 'level__middle_value', 'level__high_value',
+            'level__is_lower_better', 'standard__has_numeric_value',
+        ))
+        if not rows:
+            return 0
+
+        ids, old_grades, *columns = zip(*rows)
+        new_grades = calculate_grades(*columns)
+
+        changed = [
+            self.model(id=pk, grade=new_grade)
+            for pk, old_grade, new_grade in zip(ids, old_grades, new_grades)
+            if old_grade != new_grade
+        ]
+        self.model.objects.bulk_update(changed, ['grade'], batch_size=batch_size)
+        return len(changed)
+
+    def upsert(self, objs, batch_size=None):
+        """
+        Создает результаты одним INSERT ... ON CONFLICT. Если результат для того же
+        ученика, норматива и уровня уже есть, у него обновляются значение и оценка.
+        Сигналы сохранения не отправляются.
+
+        Ограничение уникальности распространяется и на мягко удаленные записи,
+        поэтому такая запись восстанавливается новым значением, а не остается
+        удаленной с обновленными данными.
+        """
+        return self.bulk_create(
+            objs,
+            batch_size=batch_size,
+            update_conflicts=True,
+            unique_fields=UNIQUE_RESULT_FIELDS,
+            update_fields=['value', 'grade', 'deleted_at'],
+        )
+
+
+class StudentStandardManager(SoftDeleteManager.from_queryset(StudentStandardQuerySet)):
+    def get_queryset(self):
+        return StudentStandardQuerySet(self.model, using=self._db).filter(
+            deleted_at__isnull=True
+        )
+
+
 class StudentStandard(BaseModel):
     """
     Результаты выполнения нормативов учениками.
@@ -129,33 +186,29 @@ class StudentStandard(BaseModel):
         verbose_name="Дата записи"
     )
 
+    objects = StudentStandardManager()
+
     def save(self, *args, preserve_level=True, **kwargs):
         if isinstance(self.grade, float):
             self.grade = round(self.grade)
 
-        student_class_number = self.student.student_class.number
+        rules = get_grading_rules(self.standard.who_added_id)
 
-        if not preserve_level:
-            student_class_number = self.student.student_class.number
+        current_level = rules.get_by_id(self.level_id) if self.level_id else None
+        if preserve_level and self.level_id:
+            student_class_number = current_level.level_number if current_level else self.level.level_number
         else:
-            student_class_number = self.level.level_number
+            student_class_number = self.student.student_class.number
 
-        try:
-            self.level = Level.objects.get(
-                standard=self.standard,
-                level_number=student_class_number,
-                gender=self.student.gender,
-            )
-        except Level.DoesNotExist:
+        self.level = rules.get(self.standard_id, student_class_number, self.student.gender)
+        if self.level is None:
             logging.warning(
                 f"Уровень для норматива '{self.standard.name}', класса {student_class_number} "
                 f"и пола '{self.student.get_gender_display()}' не найден."
             )
-            self.level = None
-        except Exception as e:
-            logging.error(f"Непредвиденная ошибка при сохранении результата: {e}")
-            self.level = None
-        self.grade = self.level.calculate_grade(self.value)
+            self.grade = None
+        else:
+            self.grade = self.level.calculate_grade(self.value)
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -168,3 +221,9 @@ class StudentStandard(BaseModel):
         verbose_name = "Результат ученика"
         verbose_name_plural = "Результаты учеников"
         ordering = ['-date_recorded', 'student']
+        constraints = [
+            models.UniqueConstraint(
+                fields=UNIQUE_RESULT_FIELDS,
+                name='unique_student_standard_level',
+            ),
+        ]
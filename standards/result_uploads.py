@@ -0,0 +1,246 @@
+import csv
+import io
+from itertools import islice
+
+from django.db import connection, transaction
+
+from standards.grading import calculate_grades, get_grading_rules
+from standards.models import Standard, StudentStandard
+from students.models import Student
+from users.export_cache import bump_data_version
+
+RESULTS_UPLOAD_BATCH_SIZE = 5000
+RESULTS_UPLOAD_MAX_ERRORS = 100
+
+REQUIRED_COLUMNS = ('student_id', 'standard_id', 'value')
+
+
+class ResultsUploadError(ValueError):
+    """Файл с результатами не может быть обработан"""
+
+    def __init__(self, message, errors=None):
+        super().__init__(message)
+        self.errors = errors or []
+
+
+class StudentResultsUploader:
+    """
+    Загрузка результатов учеников из CSV-файла.
+
+    Файл содержит колонки student_id, standard_id, value и необязательную
+    level_number (по умолчанию - текущий класс ученика). Строки проверяются
+    пакетами по batch_size по заранее загруженным уровням преподавателя, оценки
+    рассчитываются для всего пакета сразу, после чего пакет копируется через
+    COPY во временную таблицу. Когда файл прочитан, результаты из временной
+    таблицы одним INSERT ... ON CONFLICT переносятся в StudentStandard: существующие
+    записи с тем же учеником, нормативом и уровнем обновляются, недостающие создаются.
+
+    Строки с пустым value пропускаются, чтобы не стереть уже сохраненный результат.
+    Если хотя бы одна строка не прошла проверку, ничего не записывается.
+    """
+
+    def __init__(self, user, batch_size=RESULTS_UPLOAD_BATCH_SIZE):
+        self.user = user
+        self.batch_size = batch_size
+        self.errors = []
+        self.rows_count = 0
+        self.skipped_rows = 0
+
+        self.rules = None
+        self.standard_ids = set()
+
+    def run(self, file):
+        reader = self._reader(file)
+
+        self.rules = get_grading_rules(self.user.id)
+        self.standard_ids = set(Standard.objects.filter(who_added=self.user).values_list('id', flat=True))
+
+        with transaction.atomic():
+            with connection.cursor() as cursor:
+                self._create_staging_table(cursor)
+
+                while True:
+                    batch = list(islice(reader, self.batch_size))
+                    if not batch:
+                        break
+                    rows = self._validate_batch(batch, start=self.rows_count)
+                    self.rows_count += len(batch)
+                    if not self.errors:
+                        self._copy_to_staging(cursor, rows)
+
+                if self.errors:
+                    raise ResultsUploadError(
+                        'Файл содержит ошибки, результаты не сохранены',
+                        errors=self.errors[:RESULTS_UPLOAD_MAX_ERRORS],
+                    )
+
+                stats = self._merge(cursor)
+
+            if stats['updated_results'] or stats['created_results']:
+                bump_data_version(self.user.id)
+
+        return {'processed_rows': self.rows_count, 'skipped_rows': self.skipped_rows, **stats}
+
+    @staticmethod
+    def _reader(file):
+        text = io.TextIOWrapper(file, encoding='utf-8-sig', newline='')
+        sample = text.read(4096)
+        text.seek(0)
+
+        try:
+            dialect = csv.Sniffer().sniff(sample, delimiters=',;\t')
+        except csv.Error:
+            dialect = csv.excel
+
+        reader = csv.DictReader(text, dialect=dialect)
+        columns = [column.strip() for column in reader.fieldnames or []]
+        missing = [column for column in REQUIRED_COLUMNS if column not in columns]
+        if missing:
+            raise ResultsUploadError(f'В файле нет обязательных колонок: {", ".join(missing)}')
+        reader.fieldnames = columns
+
+        return reader
+
+    def _validate_batch(self, batch, start):
+        """
+        Проверяет строки пакета и возвращает их с найденными уровнями и рассчитанными оценками.
+        Строки с пустым value не возвращаются и учитываются в skipped_rows.
+        """
+        student_ids = {self._parse_int(entry.get('student_id')) for entry in batch}
+        students = {
+            student_id: (class_number, gender)
+            for student_id, class_number, gender in Student.objects.filter(
+                id__in=student_ids - {None},
+                student_class__class_owner=self.user,
+            ).values_list('id', 'student_class__number', 'gender')
+        }
+
+        rows = []
+        # Нумерация строк как в таблице: первая строка - заголовок
+        for row_number, entry in enumerate(batch, start=start + 2):
+            try:
+                row = self._validate_row(entry, students, row_number)
+            except ValueError as e:
+                self.errors.append({'row': row_number, 'error': str(e)})
+                continue
+
+            if row is None:
+                self.skipped_rows += 1
+            else:
+                rows.append(row)
+
+        if not rows:
+            return []
+
+        levels = [level for *_, level in rows]
+        grades = calculate_grades(
+            [value for _, _, _, value, _ in rows],
+            [level.low_value for level in levels],
+            [level.middle_value for level in levels],
+            [level.high_value for level in levels],
+            [level.is_lower_better for level in levels],
+            [level.standard.has_numeric_value for level in levels],
+        )
+        return [
+            (row_number, student_id, standard_id, level.id, value, grade)
+            for (row_number, student_id, standard_id, value, level), grade in zip(rows, grades)
+        ]
+
+    def _validate_row(self, entry, students, row_number):
+        student_id = self._parse_int(entry.get('student_id'))
+        if student_id not in students:
+            raise ValueError('Ученик не найден')
+        class_number, gender = students[student_id]
+
+        standard_id = self._parse_int(entry.get('standard_id'))
+        if standard_id not in self.standard_ids:
+            raise ValueError('Норматив не найден')
+
+        level_number = entry.get('level_number')
+        if level_number not in (None, ''):
+            level_number = self._parse_int(level_number)
+            if level_number is None:
+                raise ValueError('level_number должен быть числом')
+        else:
+            level_number = class_number
+
+        level = self.rules.get(standard_id, level_number, gender)
+        if level is None:
+            raise ValueError('Не найден уровень норматива для класса и пола ученика')
+
+        value = (entry.get('value') or '').strip().replace(',', '.')
+        if not value:
+            # Пустая ячейка означает, что результата нет, а не что его нужно удалить
+            return None
+        try:
+            value = float(value)
+        except ValueError:
+            raise ValueError('value должно быть числом')
+
+        return row_number, student_id, standard_id, value, level
+
+    @staticmethod
+    def _parse_int(value):
+        try:
+            return int(str(value).strip())
+        except (TypeError, ValueError):
+            return None
+
+    @staticmethod
+    def _create_staging_table(cursor):
+        cursor.execute(
+            'CREATE TEMPORARY TABLE results_upload ('
+            ' row_number integer NOT NULL,'
+            ' student_id bigint NOT NULL,'
+            ' standard_id bigint NOT NULL,'
+            ' level_id bigint NOT NULL,'
+            ' value double precision NOT NULL,'
+            ' grade integer'
+            ') ON COMMIT DROP'
+        )
+
+    @staticmethod
+    def _copy_to_staging(cursor, rows):
+        if not rows:
+            return
+
+        buffer = io.StringIO()
+        for row in rows:
+            buffer.write('\t'.join(r'\N' if field is None else str(field) for field in row))
+            buffer.write('\n')
+        buffer.seek(0)
+
+        cursor.copy_expert(
+            'COPY results_upload (row_number, student_id, standard_id, level_id, value, grade) FROM STDIN',
+            buffer,
+        )
+
+    @staticmethod
+    def _merge(cursor):
+        """
+        Переносит результаты из временной таблицы в StudentStandard одним INSERT ... ON CONFLICT.
+        Из повторяющихся строк для одного ученика, норматива и уровня берется последняя,
+        существующие записи обновляются, только если значение или оценка изменились
+        или запись была мягко удалена - такая запись восстанавливается.
+        """
+        table = connection.ops.quote_name(StudentStandard._meta.db_table)
+
+        cursor.execute(
+            'WITH merged AS ('
+            f' INSERT INTO {table} AS r (student_id, standard_id, level_id, value, grade, date_recorded)'
+            ' SELECT DISTINCT ON (student_id, standard_id, level_id)'
+            '  student_id, standard_id, level_id, value, grade, CURRENT_DATE'
+            ' FROM results_upload'
+            ' ORDER BY student_id, standard_id, level_id, row_number DESC'
+            ' ON CONFLICT (student_id, standard_id, level_id) DO UPDATE'
+            '  SET value = EXCLUDED.value, grade = EXCLUDED.grade, deleted_at = NULL'
+            '  WHERE r.value IS DISTINCT FROM EXCLUDED.value OR r.grade IS DISTINCT FROM EXCLUDED.grade'
+            '   OR r.deleted_at IS NOT NULL'
+            # xmax = 0 только у вставленных строк
+            ' RETURNING (xmax = 0) AS created'
+            ') '
+            'SELECT count(*) FILTER (WHERE created), count(*) FILTER (WHERE NOT created) FROM merged'
+        )
+        created, updated = cursor.fetchone()
+
+        return {'updated_results': updated, 'created_results': created}
@@ -1,7 +1,11 @@
-from django.db.models.signals import post_save, pre_save
+from collections import defaultdict
+
+from django.db.models.signals import post_save, pre_save, post_delete
 from django.dispatch import receiver
 
+from common.bulk_signals import defer_to_bulk
 from students.models import Student, StudentClass
+from standards.grading import invalidate_grading_rules
 from standards.models import Standard, Level, StudentStandard
 
 
@@ -15,38 +19,66 @@ def create_student_standard_entries(student, standards, level_filters=None, clas
         level_filters: дополнительные фильтры для уровней
         class_range: диапазон классов для создания записей
     """
-    to_create = []
-    gender = student.gender
-
-    base_filter = {'gender': gender}
-    if level_filters:
-        base_filter.update(level_filters)
-
     if not class_range:
         class_range = [student.student_class.number]
 
-    for standard in standards:
+    create_standard_entries_for_students([(student, class_range)], standards, level_filters)
+
+
+def create_standard_entries_for_students(students_with_ranges, standards, level_filters=None):
+    """
+    Создает недостающие записи StudentStandard сразу для нескольких студентов.
+    Уровни и существующие записи загружаются двумя запросами, новые записи
+    создаются одним bulk_create.
+
+    Args:
+        students_with_ranges: список пар (студент, диапазон классов)
+        standards: queryset стандартов
+        level_filters: дополнительные фильтры для уровней
+    """
+    students_with_ranges = [
+        (student, list(class_range)) for student, class_range in students_with_ranges
+    ]
+    if not students_with_ranges:
+        return
+
+    level_numbers = {num for _, class_range in students_with_ranges for num in class_range}
+    genders = {student.gender for student, _ in students_with_ranges}
+
+    levels = Level.objects.filter(
+        standard__in=standards,
+        level_number__in=level_numbers,
+        gender__in=genders,
+        **(level_filters or {})
+    )
+
+    levels_by_key = {}
+    for level in levels:
+        # Как и раньше, для каждой пары (норматив, класс) берется первый подходящий уровень
+        levels_by_key.setdefault((level.standard_id, level.level_number, level.gender), level)
+
+    levels_by_class = {}
+    for (standard_id, level_number, gender), level in levels_by_key.items():
+        levels_by_class.setdefault((level_number, gender), []).append(level)
+
+    existing = set(StudentStandard.objects.filter(
+        student__in=[student for student, _ in students_with_ranges],
+        level_id__in=[level.id for level in levels_by_key.values()],
+    ).values_list('student_id', 'standard_id', 'level_id'))
+
+    to_create = []
+    for student, class_range in students_with_ranges:
         for class_num in class_range:
-            base_filter.update({
-                'standard': standard,
-                'level_number': class_num
-            })
-
-            level = Level.objects.filter(**base_filter).first()
-            if not level:
-                continue
-
-            exists = StudentStandard.objects.filter(
-                student=student,
-                standard=standard,
-                level=level
-            ).exists()
-
-            if not exists:
+            for level in levels_by_class.get((class_num, student.gender), []):
+                key = (student.id, level.standard_id, level.id)
+                if key in existing:
+                    continue
+
+                existing.add(key)
                 to_create.append(
                     StudentStandard(
                         student=student,
-                        standard=standard,
+                        standard_id=level.standard_id,
                         level=level,
                         value=None,
                         grade=None
@@ -54,104 +86,174 @@ def create_student_standard_entries(student, standards, level_filters=None, clas
                 )
 
     if to_create:
-        StudentStandard.objects.bulk_create(to_create)
+        StudentStandard.objects.bulk_create(to_create, ignore_conflicts=True)
+
+
+def create_entries_for_owners(students_with_ranges):
+    """
+    Создает записи StudentStandard по нормативам куратора класса каждого студента.
+
+    Args:
+        students_with_ranges: список пар (студент, диапазон классов)
+    """
+    by_owner = defaultdict(list)
+    for student, class_range in students_with_ranges:
+        by_owner[student.student_class.class_owner_id].append((student, class_range))
+
+    for owner_id, owner_students in by_owner.items():
+        create_standard_entries_for_students(
+            owner_students,
+            standards=Standard.objects.filter(who_added_id=owner_id),
+        )
 
 
 @receiver(pre_save, sender=Student)
 def check_class_change(sender, instance, **kwargs):
     """Проверяет, изменился ли класс студента"""
-    if instance.pk:
-        try:
-            old_instance = Student.objects.get(pk=instance.pk)
-            if old_instance.student_class.number != instance.student_class.number:
-                update_standards_on_class_change(
-                    instance,
-                    old_class_number=old_instance.student_class.number,
-                    new_class_number=instance.student_class.number
-                )
-        except Student.DoesNotExist:
-            pass
+    if not instance.pk:
+        return
+
+    old_class_id = getattr(instance, '_loaded_student_class_id', None)
+    if old_class_id is None:
+        old_class_id = Student.objects.filter(pk=instance.pk).values_list('student_class_id', flat=True).first()
+
+    if old_class_id is None or old_class_id == instance.student_class_id:
+        return
+
+    if defer_to_bulk(update_standards_on_class_changes, instance.pk, (instance, old_class_id)):
+        return
+
+    update_standards_on_class_changes([(instance, old_class_id)])
+
+
+def update_standards_on_class_changes(changes):
+    """
+    Создает стандарты при смене класса.
+
+    Args:
+        changes: список пар (студент, id прежнего класса)
+    """
+    class_ids = {old_class_id for _, old_class_id in changes}
+    old_numbers = dict(
+        StudentClass.global_objects.filter(id__in=class_ids).values_list('id', 'number')
+    )
+
+    students_with_ranges = []
+    for student, old_class_id in changes:
+        old_class_number = old_numbers.get(old_class_id)
+        new_class_number = student.student_class.number
+        if old_class_number is not None and new_class_number > old_class_number:
+            students_with_ranges.append((student, range(old_class_number + 1, new_class_number + 1)))
+
+    create_entries_for_owners(students_with_ranges)
 
 
 @receiver(post_save, sender=StudentClass)
 def handle_student_class_change(sender, instance, **kwargs):
     """Обрабатывает изменения в классе и обновляет стандарты для всех студентов"""
-    class_owner = instance.class_owner
-    class_number = instance.number
+    if instance.is_deleted:
+        return
 
-    students = Student.objects.filter(
-        student_class=instance,
-        student_class__class_owner=class_owner
-    )
+    if defer_to_bulk(update_standards_for_classes, instance.pk, instance):
+        return
 
-    standards = Standard.objects.filter(who_added=class_owner)
+    update_standards_for_classes([instance])
 
-    for student in students:
-        create_student_standard_entries(
-            student=student,
-            standards=standards,
-            class_range=[class_number]
-        )
 
+def update_standards_for_classes(student_classes):
+    """Создает стандарты текущего года обучения для всех студентов переданных классов"""
+    students = Student.objects.filter(
+        student_class__in=[student_class.pk for student_class in student_classes]
+    ).select_related('student_class')
 
-def update_standards_on_class_change(student, old_class_number, new_class_number):
-    """Создает стандарты при смене класса"""
-    if new_class_number > old_class_number:
-        standards = Standard.objects.filter(who_added=student.student_class.class_owner)
-        create_student_standard_entries(
-            student=student,
-            standards=standards,
-            class_range=range(old_class_number + 1, new_class_number + 1)
-        )
+    create_entries_for_owners([(student, [student.student_class.number]) for student in students])
 
 
 @receiver(post_save, sender=Student)
 def create_student_standards(sender, instance, created, **kwargs):
     """Создает записи StudentStandard для нового студента при его создании"""
     if created:
-        standards = Standard.objects.filter(who_added=instance.student_class.class_owner)
-        student_class_number = instance.student_class.number
+        if defer_to_bulk(create_standards_for_new_students, instance.pk, instance):
+            return
+
+        create_standards_for_new_students([instance])
 
-        create_student_standard_entries(
-            student=instance,
-            standards=standards,
-            class_range=range(1, student_class_number + 1)
-        )
+
+def create_standards_for_new_students(students):
+    """Создает записи StudentStandard новым студентам за все годы обучения"""
+    create_entries_for_owners([
+        (student, range(1, student.student_class.number + 1)) for student in students
+    ])
 
 
 @receiver(post_save, sender=Level)
 def create_standards_when_level_created(sender, instance, created, **kwargs):
     """Создает записи StudentStandard когда создается новый уровень"""
     if created:
-        standard = instance.standard
-        gender = instance.gender
-        level_number = instance.level_number
-
-        students = Student.objects.filter(
-            student_class__class_owner=standard.who_added,
-            gender=gender,
-            student_class__number__gte=level_number
-        )
+        if defer_to_bulk(create_standards_for_new_levels, instance.pk, instance):
+            return
 
-        to_create = []
+        create_standards_for_new_levels([instance])
+
+
+def create_standards_for_new_levels(levels):
+    """
+    Создает записи StudentStandard для новых уровней всем подходящим студентам
+    куратора норматива. Студенты и существующие записи загружаются одним запросом.
+    """
+    owner_by_standard = dict(
+        Standard.objects.filter(
+            id__in={level.standard_id for level in levels}
+        ).values_list('id', 'who_added_id')
+    )
+
+    students = list(Student.objects.filter(
+        student_class__class_owner_id__in=set(owner_by_standard.values()),
+        gender__in={level.gender for level in levels},
+        student_class__number__gte=min(level.level_number for level in levels),
+    ).select_related('student_class'))
+
+    existing = set(StudentStandard.objects.filter(
+        level__in=levels
+    ).values_list('student_id', 'level_id'))
+
+    to_create = []
+    for level in levels:
+        owner_id = owner_by_standard.get(level.standard_id)
         for student in students:
-            if student.student_class.number >= level_number:
-                exists = StudentStandard.objects.filter(
-                    student=student,
-                    standard=standard,
-                    level=instance
-                ).exists()
-
-                if not exists:
-                    to_create.append(
-                        StudentStandard(
-                            student=student,
-                            standard=standard,
-                            level=instance,
-                            value=None,
-                            grade=None
-                        )
+            if (
+                    student.student_class.class_owner_id == owner_id
+                    and student.gender == level.gender
+                    and student.student_class.number >= level.level_number
+                    and (student.id, level.id) not in existing
+            ):
+                to_create.append(
+                    StudentStandard(
+                        student=student,
+                        standard_id=level.standard_id,
+                        level=level,
+                        value=None,
+                        grade=None
                     )
+                )
+
+    if to_create:
+        StudentStandard.objects.bulk_create(to_create, ignore_conflicts=True)
 
-        if to_create:
-            StudentStandard.objects.bulk_create(to_create)
\ No newline at end of file
+
+@receiver(post_delete, sender=Standard)
+@receiver(post_save, sender=Standard)
+def reset_grading_rules_on_standard_change(sender, instance, **kwargs):
+    """Сбрасывает кэш уровней преподавателя при изменении норматива"""
+    invalidate_grading_rules(instance.who_added_id)
+
+
+@receiver(post_delete, sender=Level)
+@receiver(post_save, sender=Level)
+def reset_grading_rules_on_level_change(sender, instance, **kwargs):
+    """Сбрасывает кэш уровней преподавателя при изменении уровня"""
+    try:
+        invalidate_grading_rules(instance.standard.who_added_id)
+    except Standard.DoesNotExist:
+        # Норматив удален вместе с уровнем, кэш сброшен его обработчиком
+        pass
@@ -0,0 +1,29 @@
+from celery import shared_task
+
+from standards.models import Standard, StudentStandard
+from users.export_cache import bump_data_versions
+
+REGRADE_CHUNK_SIZE = 1000
+
+
+@shared_task(bind=True)
+def regrade_levels_task(self, level_ids, chunk_size=REGRADE_CHUNK_SIZE):
+    """Асинхронный пересчет оценок результатов для уровней с измененными значениями"""
+    result_ids = list(
+        StudentStandard.objects.filter(level_id__in=level_ids).order_by('id').values_list('id', flat=True)
+    )
+    total = len(result_ids)
+    updated = 0
+
+    for start in range(0, total, chunk_size):
+        chunk = result_ids[start:start + chunk_size]
+        updated += StudentStandard.objects.filter(id__in=chunk).regrade(batch_size=chunk_size)
+        self.update_state(
+            state='PROGRESS',
+            meta={'processed': start + len(chunk), 'total': total, 'updated': updated},
+        )
+
+    if updated:
+        bump_data_versions(Standard.objects.filter(levels__id__in=level_ids).values_list('who_added_id', flat=True))
+
+    return {'processed': total, 'total': total, 'updated': updated}
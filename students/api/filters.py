@@ -1,8 +1,11 @@
+import operator
 from datetime import datetime
+from functools import reduce
 
+from django.contrib.postgres.search import TrigramWordSimilarity
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db.models import Q
-from django.db.models.functions import ExtractYear
+from django.db.models.functions import ExtractYear, Greatest
 from django_filters import rest_framework as filters
 
 from ..models import Student
@@ -82,6 +85,7 @@ class StudentFilter(filters.FilterSet):
         - Поиск по любому количеству слов
         - Частичное совпадение
         - Нечувствительность к порядку слов
+        Результаты упорядочены по сходству слов запроса с ФИО (триграммы pg_trgm).
         """
         if not value:
             return queryset
@@ -90,13 +94,20 @@ class StudentFilter(filters.FilterSet):
         if not terms:
             return queryset
 
+        fields = ['first_name', 'last_name']
+        if self.has_patronymic:
+            fields.append('patronymic')
+
         query = Q()
+        rank = []
 
         for term in terms:
-            term_query = (Q(first_name__icontains=term) |
-                          Q(last_name__icontains=term))
-            if self.has_patronymic:
-                term_query |= Q(patronymic__icontains=term)
+            term_query = Q()
+            for field in fields:
+                term_query |= Q(**{f'{field}__icontains': term})
             query &= term_query
+            rank.append(Greatest(*(TrigramWordSimilarity(term, field) for field in fields)))
 
-        return queryset.filter(query)
+        return queryset.filter(query).annotate(
+            full_name_rank=reduce(operator.add, rank)
+        ).order_by('-full_name_rank', 'last_name', 'first_name')
@@ -1,5 +1,9 @@
+import uuid
+
+from django.db import transaction
+from django.db.models import F
 from django.http import HttpResponse
-from django.template.loader import render_to_string
+from django.utils import timezone
 from django_filters import rest_framework as filters
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiParameter, OpenApiResponse
@@ -8,15 +12,38 @@ from rest_framework.decorators import action
 from rest_framework.exceptions import PermissionDenied
 from rest_framework.response import Response
 
-from common import utils
+from common.bulk_signals import bulk_signals
 from common.permissions import IsTeacher
 from standards.models import StudentStandard, Standard
+from standards.signals import update_standards_for_classes
+from students.qr_codes import QR_CODE_BOX_SIZES, QR_CODE_DEFAULT_BOX_SIZE, QR_CODES_RENDERERS, QRCodesPDFError, \
+    get_invitation_qr_pngs, write_qr_codes_pdf
+from users.api.serializers import JobSerializer
+from users.export_cache import bump_data_version
+from users.models import Job
 from . import filters as custom_filters
 from . import serializers
 from .serializers import StudentSerializer
 from .. import models
 
 
+QR_CODES_PDF_PARAMETERS = [
+    OpenApiParameter(
+        name='class_id',
+        required=True,
+        type=OpenApiTypes.INT,
+        description="ID класса, для которого нужно сгенерировать QR-коды."),
+    OpenApiParameter(
+        name='renderer',
+        required=False,
+        type=OpenApiTypes.STR,
+        enum=QR_CODES_RENDERERS,
+        default='vector',
+        description="Способ формирования PDF: vector - QR-коды рисуются векторами напрямую в PDF, "
+                    "html - PDF формируется из HTML-шаблона."),
+]
+
+
 class StudentViewSet(
     mixins.CreateModelMixin,
     mixins.UpdateModelMixin,
@@ -88,10 +115,18 @@ class StudentViewSet(
         summary="Создание нового студента",
         description="Создаёт нового студента в базе данных. "
                     "Учителя могут создавать студентов в своих классах, "
-                    "студенты не могут создавать себя.",
+                    "студенты не могут создавать себя. "
+                    "Можно передать список студентов, чтобы создать весь класс одним запросом.",
     )
     def create(self, request, *args, **kwargs):
-        return super().create(request, *args, **kwargs)
+        if not isinstance(request.data, list):
+            return super().create(request, *args, **kwargs)
+
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        with transaction.atomic(), bulk_signals():
+            self.perform_create(serializer)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     @extend_schema(
         summary="Обновление информации о студенте",
@@ -112,13 +147,7 @@ class StudentViewSet(
         summary="Генерация PDF с QR-кодами для студентов класса",
         description="Генерирует PDF-файл, содержащий QR-коды для каждого студента в классе. "
                     "QR-коды содержат ссылки на приглашения для регистрации в роли обучающегося.",
-        parameters=[
-            OpenApiParameter(
-                name='class_id',
-                required=True,
-                type=OpenApiTypes.INT,
-                description="ID класса, для которого нужно сгенерировать QR-коды.")
-        ],
+        parameters=QR_CODES_PDF_PARAMETERS,
         responses={
             200: OpenApiResponse
                 (response=OpenApiTypes.BINARY)
@@ -126,87 +155,220 @@ class StudentViewSet(
     )
     @action(detail=False, methods=['get'])
     def generate_qr_codes_pdf(self, request):
-        import base64
-        import qrcode
         from io import BytesIO
-        from xhtml2pdf import pisa
 
-        class_id = request.query_params.get('class_id')
-        if not class_id:
+        student_class, error = self._get_qr_codes_class(request)
+        if error:
+            return error
+
+        renderer, error = self._get_qr_codes_renderer(request)
+        if error:
+            return error
+
+        result = BytesIO()
+        try:
+            write_qr_codes_pdf(student_class, result, renderer=renderer)
+        except QRCodesPDFError as e:
             return Response(
-                {"error": "Необходимо указать параметр class_id"},
+                {"error": str(e)},
+                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+            )
+
+        response = HttpResponse(result.getvalue(), content_type='application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="qr_codes_class_{student_class.id}.pdf"'
+
+        return response
+
+    @extend_schema(
+        summary="Запускает фоновую генерацию PDF с QR-кодами для студентов класса",
+        description="Возвращает задачу, результат которой можно скачать через /jobs/{id}/download/",
+        parameters=QR_CODES_PDF_PARAMETERS,
+        request=None,
+        responses={202: JobSerializer},
+    )
+    @action(detail=False, methods=['post'])
+    def generate_qr_codes_pdf_job(self, request):
+        from students.tasks import qr_codes_pdf_job_task
+
+        student_class, error = self._get_qr_codes_class(request)
+        if error:
+            return error
+
+        renderer, error = self._get_qr_codes_renderer(request)
+        if error:
+            return error
+
+        job = Job.objects.create(
+            owner=request.user,
+            kind='qr_codes_pdf',
+            params={'class_id': student_class.id, 'renderer': renderer},
+        )
+
+        transaction.on_commit(lambda: qr_codes_pdf_job_task.delay(job.id))
+        return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @extend_schema(
+        summary="Запускает фоновую генерацию QR-кодов сразу для нескольких классов",
+        description="Формирует QR-коды приглашений для выбранных классов или для всех неархивных классов "
+                    "преподавателя одним файлом: общий PDF или ZIP-архив с PDF для каждого класса. "
+                    "Возвращает задачу, результат которой можно скачать через /jobs/{id}/download/",
+        parameters=[
+            OpenApiParameter(
+                name='class_id[]',
+                required=False,
+                type=OpenApiTypes.INT,
+                many=True,
+                description="ID классов. Не указывается, если передан all=true."),
+            OpenApiParameter(
+                name='all',
+                required=False,
+                type=OpenApiTypes.BOOL,
+                default=False,
+                description="Сформировать QR-коды для всех неархивных классов."),
+            OpenApiParameter(
+                name='format',
+                required=False,
+                type=OpenApiTypes.STR,
+                enum=('pdf', 'zip'),
+                default='pdf',
+                description="pdf - один PDF для всех классов, zip - архив с отдельным PDF для каждого класса."),
+        ],
+        request=None,
+        responses={202: JobSerializer},
+    )
+    @action(detail=False, methods=['post'])
+    def generate_qr_codes_batch_job(self, request):
+        from students.tasks import qr_codes_batch_job_task
+
+        archive_format = request.query_params.get('format', 'pdf')
+        if archive_format not in ('pdf', 'zip'):
+            return Response(
+                {"error": "Параметр format должен быть pdf или zip"},
                 status=status.HTTP_400_BAD_REQUEST
             )
 
-        try:
-            student_class = models.StudentClass.objects.get(id=class_id)
-            if student_class.class_owner != request.user:
+        classes = models.StudentClass.objects.filter(class_owner=request.user)
+        if request.query_params.get('all', 'false').lower() == 'true':
+            classes = classes.filter(is_archived=False)
+        else:
+            class_ids = request.query_params.getlist('class_id[]')
+            if not class_ids:
                 return Response(
-                    {"error": "У вас нет доступа к этому классу"},
-                    status=status.HTTP_403_FORBIDDEN
+                    {"error": "Необходимо указать параметр class_id[] или all=true"},
+                    status=status.HTTP_400_BAD_REQUEST
                 )
-        except Exception:
+            try:
+                class_ids = {int(class_id) for class_id in class_ids}
+            except ValueError:
+                return Response(
+                    {"error": "Параметры class_id[] должны быть числами."},
+                    status=status.HTTP_400_BAD_REQUEST
+                )
+            classes = classes.filter(id__in=class_ids)
+            if classes.count() != len(class_ids):
+                return Response(
+                    {"error": "Классы не найдены или у вас нет к ним доступа"},
+                    status=status.HTTP_404_NOT_FOUND
+                )
+
+        class_ids = list(classes.values_list('id', flat=True))
+        if not class_ids:
             return Response(
-                {"error": f"Класс не найден"},
+                {"error": "Нет классов для генерации QR-кодов"},
                 status=status.HTTP_404_NOT_FOUND
             )
 
-        students = models.Student.objects.filter(student_class=student_class)
-
-        qr_data = []
-        for student in students:
-            if hasattr(student, 'invitation') and not student.invitation.is_used:
-                try:
-                    invitation_link = student.invitation.get_join_link()
-                    qr = qrcode.QRCode(
-                        version=1,
-                        error_correction=qrcode.constants.ERROR_CORRECT_L,
-                        box_size=10,
-                        border=4,
-                    )
-                    qr.add_data(invitation_link)
-                    qr.make(fit=True)
-                    img = qr.make_image(fill_color="black", back_color="white")
-
-                    buffer = BytesIO()
-                    img.save(buffer, format="PNG")
-                    qr_image_base64 = base64.b64encode(buffer.getvalue()).decode('utf-8')
-
-                    qr_data.append({
-                        'invite_code': student.invitation.invite_code,
-                        'initials': student.initials,
-                        'invitation_link': invitation_link,
-                        'qr_code': qr_image_base64,
-                    })
-                except Exception as e:
-                    print(f"Ошибка при создании QR-кода: {e}")
-
-        html_string = render_to_string('qr_codes_template.html', {
-            'student_class': student_class,
-            'qr_data': qr_data,
-        })
+        job = Job.objects.create(
+            owner=request.user,
+            kind='qr_codes_batch',
+            params={'class_ids': class_ids, 'format': archive_format},
+        )
 
-        result = BytesIO()
+        transaction.on_commit(lambda: qr_codes_batch_job_task.delay(job.id))
+        return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
 
-        pisa_status = pisa.CreatePDF(
-            html_string,
-            dest=result,
-            encoding='UTF-8',
-            link_callback=utils.link_callback
-        )
+    @extend_schema(
+        summary="QR-код приглашения студента",
+        description="Возвращает PNG с QR-кодом приглашения студента для регистрации в роли обучающегося. "
+                    "Доступно, пока приглашение не использовано.",
+        parameters=[
+            OpenApiParameter(
+                name='box_size',
+                required=False,
+                type=OpenApiTypes.INT,
+                enum=QR_CODE_BOX_SIZES,
+                default=QR_CODE_DEFAULT_BOX_SIZE,
+                description="Размер модуля QR-кода в пикселях.")
+        ],
+        responses={
+            (200, 'image/png'): OpenApiTypes.BINARY
+        },
+    )
+    @action(detail=True, methods=['get'])
+    def qr_code(self, request, pk=None):
+        if getattr(request.user, 'role', None) != 'teacher':
+            raise PermissionDenied("У вас нет прав доступа к приглашениям студентов.")
 
-        if pisa_status.err:
+        try:
+            box_size = int(request.query_params.get('box_size', QR_CODE_DEFAULT_BOX_SIZE))
+        except ValueError:
+            box_size = None
+        if box_size not in QR_CODE_BOX_SIZES:
             return Response(
-                {"error": f"Ошибка при создании PDF: {pisa_status.err}"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
+                {"error": f"Параметр box_size должен быть одним из: {', '.join(map(str, QR_CODE_BOX_SIZES))}"},
+                status=status.HTTP_400_BAD_REQUEST
             )
 
-        result.seek(0)
-        response = HttpResponse(result.getvalue(), content_type='application/pdf')
-        response['Content-Disposition'] = f'attachment; filename="qr_codes_class_{class_id}.pdf"'
+        student = self.get_object()
+        invitation = models.Invitation.objects.filter(student=student, is_used=False).first()
+        if invitation is None:
+            return Response(
+                {"error": "У студента нет неиспользованного приглашения"},
+                status=status.HTTP_404_NOT_FOUND
+            )
 
+        png, = get_invitation_qr_pngs([invitation], box_size)
+        response = HttpResponse(png, content_type='image/png')
+        response['Content-Disposition'] = f'inline; filename="qr_code_{invitation.invite_code}.png"'
         return response
 
+    @staticmethod
+    def _get_qr_codes_class(request):
+        """Возвращает класс из параметра class_id или ответ с ошибкой"""
+        class_id = request.query_params.get('class_id')
+        if not class_id:
+            return None, Response(
+                {"error": "Необходимо указать параметр class_id"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            student_class = models.StudentClass.objects.get(id=class_id)
+        except Exception:
+            return None, Response(
+                {"error": f"Класс не найден"},
+                status=status.HTTP_404_NOT_FOUND
+            )
+
+        if student_class.class_owner != request.user:
+            return None, Response(
+                {"error": "У вас нет доступа к этому классу"},
+                status=status.HTTP_403_FORBIDDEN
+            )
+
+        return student_class, None
+
+    @staticmethod
+    def _get_qr_codes_renderer(request):
+        """Возвращает способ формирования PDF из параметра renderer или ответ с ошибкой"""
+        renderer = request.query_params.get('renderer', 'vector')
+        if renderer not in QR_CODES_RENDERERS:
+            return None, Response(
+                {"error": f"Параметр renderer должен быть одним из: {', '.join(QR_CODES_RENDERERS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return renderer, None
+
 
 class StudentClassViewSet(
     mixins.ListModelMixin,
@@ -252,7 +414,8 @@ class StudentClassViewSet(
                     "Учителя могут удалять только свои классы.",
     )
     def destroy(self, request, *args, **kwargs):
-        return super().destroy(request, *args, **kwargs)
+        with transaction.atomic(), bulk_signals():
+            return super().destroy(request, *args, **kwargs)
 
     @extend_schema(
         summary="Переводит все классы на следующий год обучения",
@@ -264,14 +427,36 @@ class StudentClassViewSet(
     def promote(self, request, *args, **kwargs):
         user = request.user
 
-        models.StudentClass.objects.filter(class_owner=user, number=11).delete()
+        with transaction.atomic():
+            self._archive_graduating_classes(user)
 
-        classes_to_update = models.StudentClass.objects.filter(class_owner=user)
-        for student_class in classes_to_update:
-            student_class.number += 1
-            student_class.save()
+            models.StudentClass.objects.filter(class_owner=user).update(number=F('number') + 1)
 
-        updated_classes = models.StudentClass.objects.filter(class_owner=user)
+            updated_classes = models.StudentClass.objects.filter(class_owner=user)
+            update_standards_for_classes(list(updated_classes))
+
+            bump_data_version(user.id)
 
         serializer = serializers.StudentClassSerializer(updated_classes, many=True)
         return Response(serializer.data, status=status.HTTP_200_OK)
+
+    @staticmethod
+    def _archive_graduating_classes(user):
+        """
+        Мягко удаляет 11 классы вместе с учениками, приглашениями и результатами.
+        Вместо каскадного удаления по одной записи выполняется по одному UPDATE на таблицу
+        с общим transaction_id, чтобы восстановление работало так же, как после delete().
+        """
+        deleted = {
+            'deleted_at': timezone.now(),
+            'restored_at': None,
+            'transaction_id': uuid.uuid4(),
+        }
+
+        graduating_classes = models.StudentClass.objects.filter(class_owner=user, number=11)
+        graduating_students = models.Student.objects.filter(student_class__in=graduating_classes)
+
+        StudentStandard.objects.filter(student__in=graduating_students).update(**deleted)
+        models.Invitation.objects.filter(student__in=graduating_students).update(**deleted)
+        graduating_students.update(**deleted)
+        graduating_classes.update(**deleted)
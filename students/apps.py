@@ -6,5 +6,9 @@ class StudentsConfig(AppConfig):
     name = 'students'
 
     def ready(self):
+        from django.db.models.signals import pre_migrate
+
         import students.signals
 
+        pre_migrate.connect(students.signals.create_trigram_extension, sender=self)
+
@@ -1,8 +1,10 @@
 import datetime
 
+from django.contrib.postgres.indexes import GinIndex, OpClass
 from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator, MaxValueValidator
 from django.db import models
+from django.db.models.functions import Upper
 from django.utils import timezone
 
 from common.models import (
@@ -90,6 +92,13 @@ class Student(HumanModel):
         verbose_name="Учетная запись ученика",
     )
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Класс на момент загрузки, нужен для очистки опустевшего класса после перевода ученика
+        instance._loaded_student_class_id = instance.__dict__.get('student_class_id')
+        return instance
+
     def __str__(self):
         return f"Ученик {self.full_name} ({self.birthday.strftime('%d.%m.%Y')} г.р.), {self.student_class}"
 
@@ -97,6 +106,12 @@ class Student(HumanModel):
         verbose_name = "Ученик"
         verbose_name_plural = "Ученики"
         ordering = ['student_class']
+        # Триграммные индексы для поиска по ФИО: icontains выполняется как UPPER(поле) LIKE '%...%'
+        indexes = [
+            GinIndex(OpClass(Upper('last_name'), name='gin_trgm_ops'), name='student_last_name_trgm'),
+            GinIndex(OpClass(Upper('first_name'), name='gin_trgm_ops'), name='student_first_name_trgm'),
+            GinIndex(OpClass(Upper('patronymic'), name='gin_trgm_ops'), name='student_patronymic_trgm'),
+        ]
 
 
 class Invitation(BaseModel):
@@ -0,0 +1,345 @@
+import base64
+import logging
+import multiprocessing
+import os
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from itertools import groupby, islice
+
+import qrcode
+from django.conf import settings
+from django.core.cache import cache
+from django.template.loader import render_to_string
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.units import cm
+
+from common import utils
+from students.models import Student
+
+QR_CODE_CACHE_KEY = "qr_code:{invite_code}:{box_size}"
+QR_MATRIX_CACHE_KEY = "qr_matrix:{invite_code}"
+QR_CODE_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+
+# Допустимые размеры модуля QR-кода в пикселях, для каждого хранится отдельное изображение
+QR_CODE_BOX_SIZES = (5, 10, 20)
+QR_CODE_DEFAULT_BOX_SIZE = 10
+
+QR_CODES_RENDERERS = ('vector', 'html')
+
+# Разметка страницы векторного PDF с QR-кодами
+QR_CODES_PDF_FONT = 'DejaVuSerif'
+QR_CODES_PDF_MARGIN = 1 * cm
+QR_CODES_PDF_TITLE_HEIGHT = 1.5 * cm
+QR_CODES_PDF_COLUMNS = 4
+QR_CODES_PDF_ROWS = 5
+QR_CODES_PDF_QR_SIZE = 3.5 * cm
+QR_CODES_PDF_CELL_HEIGHT = 4.9 * cm
+
+
+class QRCodesPDFError(RuntimeError):
+    """PDF с QR-кодами не может быть сформирован"""
+
+
+def make_qr_png(data, box_size=QR_CODE_DEFAULT_BOX_SIZE):
+    """Рисует QR-код для строки data и возвращает его в формате PNG"""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=box_size,
+        border=4,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    img = qr.make_image(fill_color="black", back_color="white")
+
+    buffer = BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def make_qr_matrix(data):
+    """Матрица модулей QR-кода для строки data: строки из True для темных модулей"""
+    qr = qrcode.QRCode(
+        version=1,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        border=4,
+    )
+    qr.add_data(data)
+    qr.make(fit=True)
+    return qr.get_matrix()
+
+
+def _map(func, *iterables, pool=False, chunksize=1):
+    """
+    map() с необязательным пулом из QR_CODES_WORKERS процессов.
+
+    Пул запускается только по явному pool=True (фоновые задачи) и не запускается
+    из демонических процессов, которым нельзя порождать дочерние.
+    """
+    if not pool or settings.QR_CODES_WORKERS <= 1 or multiprocessing.current_process().daemon:
+        return list(map(func, *iterables))
+
+    with ProcessPoolExecutor(max_workers=settings.QR_CODES_WORKERS) as executor:
+        return list(executor.map(func, *iterables, chunksize=chunksize))
+
+
+def make_qr_pngs(links, box_size=QR_CODE_DEFAULT_BOX_SIZE, pool=False):
+    """
+    Рисует QR-коды для списка ссылок. С pool=True изображения рисуются
+    параллельно в пуле процессов, иначе - последовательно в текущем процессе.
+    """
+    return _map(make_qr_png, links, [box_size] * len(links), pool=pool, chunksize=8)
+
+
+def _qr_code_cache_key(invite_code, box_size):
+    return QR_CODE_CACHE_KEY.format(invite_code=invite_code, box_size=box_size)
+
+
+def _get_cached_for_invitations(invitations, make_key, render):
+    """
+    Возвращает данные для приглашений в том же порядке. Данные берутся из кэша
+    по ключу make_key(invite_code), недостающие формируются одним вызовом
+    render(ссылки) и сохраняются в кэш.
+    """
+    keys = [make_key(invitation.invite_code) for invitation in invitations]
+    cached = cache.get_many(keys)
+
+    missing = [
+        (key, invitation) for key, invitation in zip(keys, invitations) if key not in cached
+    ]
+    if missing:
+        values = render([invitation.get_join_link() for _, invitation in missing])
+        rendered = {key: value for (key, _), value in zip(missing, values)}
+        cache.set_many(rendered, QR_CODE_CACHE_TIMEOUT)
+        cached.update(rendered)
+
+    return [cached[key] for key in keys]
+
+
+def get_invitation_qr_pngs(invitations, box_size=QR_CODE_DEFAULT_BOX_SIZE, pool=False):
+    """
+    Возвращает PNG с QR-кодами приглашений в том же порядке.
+
+    Изображения берутся из кэша по коду приглашения и размеру, недостающие
+    рисуются одним пакетом и сохраняются в кэш.
+    """
+    return _get_cached_for_invitations(
+        invitations,
+        lambda invite_code: _qr_code_cache_key(invite_code, box_size),
+        lambda links: make_qr_pngs(links, box_size, pool=pool),
+    )
+
+
+def get_invitation_qr_matrices(invitations, pool=False):
+    """
+    Возвращает матрицы модулей QR-кодов приглашений для векторного PDF в том же порядке.
+    Кэшируются по коду приглашения так же, как PNG, недостающие строятся одним пакетом.
+    """
+    return _get_cached_for_invitations(
+        invitations,
+        lambda invite_code: QR_MATRIX_CACHE_KEY.format(invite_code=invite_code),
+        lambda links: _map(make_qr_matrix, links, pool=pool, chunksize=8),
+    )
+
+
+def evict_qr_codes(invite_code):
+    """Удаляет из кэша QR-коды приглашения всех размеров и его матрицу модулей"""
+    cache.delete_many([
+        *(_qr_code_cache_key(invite_code, box_size) for box_size in QR_CODE_BOX_SIZES),
+        QR_MATRIX_CACHE_KEY.format(invite_code=invite_code),
+    ])
+
+
+def get_pending_invitations(student_class):
+    """Ученики класса с неиспользованными приглашениями, приглашения загружаются тем же запросом"""
+    return list(
+        Student.objects.filter(
+            student_class=student_class,
+            invitation__isnull=False,
+            invitation__is_used=False,
+        ).select_related('invitation')
+    )
+
+
+def write_qr_codes_pdf(student_class, output, renderer='vector', pool=False):
+    """
+    Формирует PDF с QR-кодами приглашений учеников класса и записывает его в output.
+    Возвращает количество QR-кодов в файле.
+
+    renderer='vector' рисует QR-коды векторными прямоугольниками сразу в PDF,
+    renderer='html' формирует PDF из шаблона qr_codes_template.html через xhtml2pdf.
+    QR-коды берутся из кэша, с pool=True недостающие строятся в пуле процессов.
+    """
+    students = get_pending_invitations(student_class)
+
+    if renderer == 'html':
+        _write_html_pdf(student_class, students, output, pool=pool)
+    else:
+        output.write(render_vector_pdf(str(student_class), qr_cards(students, pool=pool)))
+
+    return len(students)
+
+
+def write_qr_codes_batch(classes, output, archive_format='pdf', pool=False):
+    """
+    Формирует QR-коды приглашений сразу для нескольких классов и записывает их в output:
+    archive_format='pdf' - один PDF со страницами всех классов подряд,
+    archive_format='zip' - ZIP-архив с отдельным PDF для каждого класса.
+    Возвращает количество QR-кодов.
+
+    Приглашения всех классов загружаются одним запросом. С pool=True PDF классов
+    рисуются параллельно в пуле процессов.
+    """
+    from pypdf import PdfWriter
+
+    students_by_class = {student_class.id: [] for student_class in classes}
+    for student in Student.objects.filter(
+            student_class__in=classes,
+            invitation__isnull=False,
+            invitation__is_used=False,
+    ).select_related('invitation'):
+        students_by_class[student.student_class_id].append(student)
+
+    class_names = [str(student_class) for student_class in classes]
+    # Матрицы QR-кодов всех классов берутся из кэша и строятся одним пакетом
+    all_cards = iter(qr_cards(
+        [student for student_class in classes for student in students_by_class[student_class.id]],
+        pool=pool,
+    ))
+    cards = [list(islice(all_cards, len(students_by_class[student_class.id]))) for student_class in classes]
+    total = sum(len(class_cards) for class_cards in cards)
+
+    pdfs = _map(render_vector_pdf, class_names, cards, pool=pool and len(classes) > 1)
+
+    if archive_format == 'zip':
+        with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+            for student_class, pdf in zip(classes, pdfs):
+                archive.writestr(f'qr_codes_class_{student_class}_{student_class.id}.pdf', pdf)
+    else:
+        writer = PdfWriter()
+        for pdf in pdfs:
+            writer.append(BytesIO(pdf))
+        writer.write(output)
+
+    return total
+
+
+def qr_cards(students, pool=False):
+    """Данные карточек для векторного PDF: (код приглашения, матрица QR-кода, инициалы)"""
+    matrices = get_invitation_qr_matrices([student.invitation for student in students], pool=pool)
+    return [
+        (student.invitation.invite_code, matrix, student.initials)
+        for student, matrix in zip(students, matrices)
+    ]
+
+
+def render_vector_pdf(class_name, cards):
+    """Рисует векторный PDF с QR-кодами класса и возвращает его содержимое"""
+    output = BytesIO()
+    canvas = create_vector_canvas(output)
+    draw_qr_codes_pages(canvas, class_name, cards)
+    canvas.save()
+    return output.getvalue()
+
+
+def create_vector_canvas(output):
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen.canvas import Canvas
+
+    if QR_CODES_PDF_FONT not in pdfmetrics.getRegisteredFontNames():
+        font_path = os.path.join(settings.BASE_DIR, 'static', 'fonts', f'{QR_CODES_PDF_FONT}.ttf')
+        pdfmetrics.registerFont(TTFont(QR_CODES_PDF_FONT, font_path))
+
+    return Canvas(output, pagesize=A4)
+
+
+def draw_qr_codes_pages(canvas, class_name, cards):
+    """
+    Рисует страницы с QR-кодами учеников класса: заголовок и сетка
+    QR_CODES_PDF_COLUMNS x QR_CODES_PDF_ROWS карточек на странице.
+    """
+    page_width, page_height = A4
+    cell_width = (page_width - 2 * QR_CODES_PDF_MARGIN) / QR_CODES_PDF_COLUMNS
+    per_page = QR_CODES_PDF_COLUMNS * QR_CODES_PDF_ROWS
+    title = f"QR-коды для приглашения класса {class_name}"
+
+    for page_start in range(0, max(len(cards), 1), per_page):
+        canvas.setFont(QR_CODES_PDF_FONT, 14)
+        canvas.drawCentredString(page_width / 2, page_height - QR_CODES_PDF_MARGIN - 14, title)
+        top = page_height - QR_CODES_PDF_MARGIN - QR_CODES_PDF_TITLE_HEIGHT
+
+        for index, card in enumerate(cards[page_start:page_start + per_page]):
+            row, column = divmod(index, QR_CODES_PDF_COLUMNS)
+            x = QR_CODES_PDF_MARGIN + column * cell_width
+            y = top - (row + 1) * QR_CODES_PDF_CELL_HEIGHT
+            _draw_qr_card(canvas, card, x, y, cell_width)
+
+        canvas.showPage()
+
+
+def _draw_qr_card(canvas, card, x, y, width):
+    """Карточка ученика: пунктирная рамка, QR-код, код приглашения и инициалы"""
+    invite_code, matrix, initials = card
+
+    canvas.setDash(3, 2)
+    canvas.setStrokeColorRGB(0.6, 0.6, 0.6)
+    canvas.rect(x, y, width, QR_CODES_PDF_CELL_HEIGHT, stroke=1, fill=0)
+    canvas.setDash()
+
+    qr_x = x + (width - QR_CODES_PDF_QR_SIZE) / 2
+    qr_y = y + QR_CODES_PDF_CELL_HEIGHT - QR_CODES_PDF_QR_SIZE - 0.2 * cm
+    _draw_qr_modules(canvas, matrix, qr_x, qr_y, QR_CODES_PDF_QR_SIZE)
+
+    canvas.setFont(QR_CODES_PDF_FONT, 9)
+    canvas.drawCentredString(x + width / 2, qr_y - 0.45 * cm, invite_code)
+    canvas.drawCentredString(x + width / 2, qr_y - 0.9 * cm, initials)
+
+
+def _draw_qr_modules(canvas, matrix, x, y, size):
+    """Рисует матрицу QR-кода одним контуром из горизонтальных полос темных модулей"""
+    module = size / len(matrix)
+    path = canvas.beginPath()
+    for row_index, row in enumerate(matrix):
+        row_y = y + size - (row_index + 1) * module
+        column = 0
+        for is_dark, run in groupby(row):
+            length = len(list(run))
+            if is_dark:
+                path.rect(x + column * module, row_y, length * module, module)
+            column += length
+
+    canvas.setFillColorRGB(0, 0, 0)
+    canvas.drawPath(path, stroke=0, fill=1)
+
+
+def _write_html_pdf(student_class, students, output, pool=False):
+    from xhtml2pdf import pisa
+
+    pngs = get_invitation_qr_pngs([student.invitation for student in students], pool=pool)
+
+    qr_data = []
+    for student, png in zip(students, pngs):
+        qr_data.append({
+            'invite_code': student.invitation.invite_code,
+            'initials': student.initials,
+            'invitation_link': student.invitation.get_join_link(),
+            'qr_code': base64.b64encode(png).decode('utf-8'),
+        })
+
+    html_string = render_to_string('qr_codes_template.html', {
+        'student_class': student_class,
+        'qr_data': qr_data,
+    })
+
+    pisa_status = pisa.CreatePDF(
+        html_string,
+        dest=output,
+        encoding='UTF-8',
+        link_callback=utils.link_callback
+    )
+
+    if pisa_status.err:
+        logging.error('Ошибка при создании PDF с QR-кодами класса %s: %s', student_class.id, pisa_status.err)
+        raise QRCodesPDFError(f"Ошибка при создании PDF: {pisa_status.err}")
@@ -1,16 +1,39 @@
 import uuid
 
+from django.db import connections, transaction
 from django.db.models import Count
 from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
+from common.bulk_signals import defer_to_bulk
 from students.models import Student, Invitation, StudentClass
+from students.qr_codes import evict_qr_codes
+
+
+def create_invitations(students):
+    """Создает приглашения для студентов, у которых их еще нет, одним bulk_create."""
+    with_invitation = set(
+        Invitation.global_objects.filter(student__in=students).values_list('student_id', flat=True)
+    )
+
+    Invitation.objects.bulk_create([
+        Invitation(
+            student=student,
+            invite_code=uuid.uuid4().hex[:8].upper(),
+            is_used=False
+        )
+        for student in students
+        if student.id not in with_invitation
+    ])
 
 
 @receiver(post_save, sender=Student)
 def create_invitation(sender, instance, created, **kwargs):
     """Создает приглашение для нового студента."""
     if created:
+        if defer_to_bulk(create_invitations, instance.pk, instance):
+            return
+
         if not hasattr(instance, 'invitation'):
             invite_code = uuid.uuid4().hex[:8].upper()
             Invitation.objects.create(
@@ -20,14 +43,52 @@ def create_invitation(sender, instance, created, **kwargs):
             )
 
 
+@receiver(post_delete, sender=Invitation)
+@receiver(post_save, sender=Invitation)
+def evict_used_invitation_qr_codes(sender, instance, **kwargs):
+    """Удаляет из кэша QR-коды использованного или удаленного приглашения."""
+    if instance.is_used or kwargs.get('signal') is post_delete:
+        evict_qr_codes(instance.invite_code)
+
+
+def delete_empty_classes(class_ids):
+    """Удаляет классы из переданных, в которых не осталось учеников."""
+    StudentClass.objects.filter(id__in=class_ids).annotate(
+        student_count=Count('students')
+    ).filter(student_count=0).delete()
+
+
+def delete_empty_classes_on_commit(class_ids):
+    """Откладывает удаление пустых классов до фиксации транзакции."""
+    transaction.on_commit(lambda: delete_empty_classes(class_ids))
+
+
 @receiver(post_delete, sender=Student)
 @receiver(post_save, sender=Student)
 def clean_empty_classes(sender, instance, **kwargs):
     """
-    Находит и удаляет все пустые классы после изменений студентов.
+    Удаляет старый и новый класс студента, если в них не осталось студентов.
     """
-    empty_classes = StudentClass.objects.annotate(
-        student_count=Count('students')
-    ).filter(student_count=0)
+    class_ids = {instance.student_class_id, getattr(instance, '_loaded_student_class_id', None)}
+    class_ids.discard(None)
+    instance._loaded_student_class_id = instance.student_class_id
+
+    if kwargs.get('created'):
+        return
+
+    deferred = [defer_to_bulk(delete_empty_classes_on_commit, class_id, class_id) for class_id in class_ids]
+    if all(deferred):
+        return
 
-    empty_classes.delete()
\ No newline at end of file
+    delete_empty_classes(class_ids)
+
+
+def create_trigram_extension(sender, using, **kwargs):
+    """
+    Подключает расширение pg_trgm до применения миграций, так как миграции
+    создаются при развертывании, а триграммные индексы учеников требуют его.
+    """
+    connection = connections[using]
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
@@ -0,0 +1,60 @@
+import tempfile
+
+from celery import shared_task
+from django.core.files import File
+
+
+@shared_task
+def qr_codes_pdf_job_task(job_id):
+    """Фоновое формирование PDF с QR-кодами приглашений учеников класса"""
+    from students.models import StudentClass
+    from students.qr_codes import write_qr_codes_pdf
+    from users.models import Job
+
+    job = Job.objects.get(pk=job_id)
+    job.mark_running()
+
+    try:
+        student_class = StudentClass.objects.get(id=job.params['class_id'], class_owner_id=job.owner_id)
+        with tempfile.TemporaryFile() as output:
+            qr_codes = write_qr_codes_pdf(
+                student_class,
+                output,
+                renderer=job.params.get('renderer', 'vector'),
+                pool=True,
+            )
+            output.seek(0)
+            job.mark_success(
+                result={'qr_codes': qr_codes},
+                artifact=File(output),
+                artifact_name=f"qr_codes_class_{student_class.id}.pdf",
+            )
+    except Exception as e:
+        job.mark_failure(f'Ошибка при создании PDF: {str(e)}')
+        raise
+
+
+@shared_task
+def qr_codes_batch_job_task(job_id):
+    """Фоновое формирование QR-кодов приглашений сразу для нескольких классов"""
+    from students.models import StudentClass
+    from students.qr_codes import write_qr_codes_batch
+    from users.models import Job
+
+    job = Job.objects.get(pk=job_id)
+    job.mark_running()
+
+    archive_format = job.params.get('format', 'pdf')
+    try:
+        classes = list(StudentClass.objects.filter(id__in=job.params['class_ids'], class_owner_id=job.owner_id))
+        with tempfile.TemporaryFile() as output:
+            qr_codes = write_qr_codes_batch(classes, output, archive_format=archive_format, pool=True)
+            output.seek(0)
+            job.mark_success(
+                result={'classes': len(classes), 'qr_codes': qr_codes},
+                artifact=File(output),
+                artifact_name=f"qr_codes_classes.{archive_format}",
+            )
+    except Exception as e:
+        job.mark_failure(f'Ошибка при создании PDF: {str(e)}')
+        raise
@@ -155,3 +155,26 @@ class PasswordResetConfirmSerializer(serializers.Serializer):
         if data['new_password'] != data['confirm_password']:
             raise serializers.ValidationError("Пароли не совпадают.")
         return data
+
+
+class JobSerializer(serializers.ModelSerializer):
+    has_artifact = serializers.SerializerMethodField()
+
+    class Meta:
+        model = models.Job
+        fields = (
+            "id",
+            "kind",
+            "status",
+            "progress",
+            "result",
+            "error",
+            "has_artifact",
+            "artifact_name",
+            "created_at",
+            "finished_at",
+        )
+        read_only_fields = fields
+
+    def get_has_artifact(self, obj) -> bool:
+        return bool(obj.artifact)
@@ -6,7 +6,7 @@ from rest_framework_simplejwt.views import (
 )
 
 from .views import UserLoginView, UserViewSet, UserProfileViewSet, UserLogoutView, JoinByInvitationView, \
-    VerifyEmailView, PasswordResetViewSet, TeacherImportExportViewSet, ResendConformationEmailView
+    VerifyEmailView, PasswordResetViewSet, TeacherImportExportViewSet, ResendConformationEmailView, JobViewSet
 
 user_router = routers.DefaultRouter()
 user_router.register(r'login', UserLoginView, basename='login')
@@ -17,6 +17,7 @@ user_router.register(r'create-user/from-invitation', JoinByInvitationView, basen
 user_router.register(r'email/reset-password', PasswordResetViewSet, basename='reset-password')
 user_router.register(r'profile', TeacherImportExportViewSet, basename='import-export')
 user_router.register(r'email/resend-confirmation', ResendConformationEmailView, basename='users')
+user_router.register(r'jobs', JobViewSet, basename='jobs')
 urlpatterns = [
     path("", include(user_router.urls)),
     path('token/', TokenObtainPairView.as_view(), name='token_obtain_pair'),
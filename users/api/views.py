@@ -1,14 +1,10 @@
-import datetime
-import json
+import logging
 import uuid
 from datetime import timedelta
 
-import pandas as pd
-import io
-
 from django.contrib.auth import authenticate, login, logout
 from django.db import transaction
-from django.http import HttpResponse
+from django.http import StreamingHttpResponse, FileResponse
 from django.middleware.csrf import get_token
 from drf_spectacular.types import OpenApiTypes
 from drf_spectacular.utils import extend_schema, OpenApiParameter
@@ -19,13 +15,11 @@ from rest_framework.generics import get_object_or_404
 from rest_framework.response import Response
 from rest_framework.utils import timezone
 
-from common.excel_utils import write_headers_and_data, create_excel_formats
 from common.permissions import IsTeacher
-from standards.models import Standard, StudentStandard, Level
 from students.api.serializers import InvitationDetailSerializer
 from students.models import Invitation
 from users import models
-from users.api.serializers import UserSerializer, UserCreateSerializer, ChangePasswordSerializer, \
+from users.api.serializers import JobSerializer, UserSerializer, UserCreateSerializer, ChangePasswordSerializer, \
     ChangeUserDetailsSerializer, ChangeUserEmailSerializer, UserLoginSerializer, UserInvitationSerializer, \
     PasswordResetRequestSerializer, PasswordResetConfirmSerializer
 from users.signals import send_confirmation_email
@@ -349,6 +343,34 @@ class VerifyEmailView(viewsets.ViewSet):
         return Response({'message': 'Email успешно подтвержден'}, status=status.HTTP_200_OK)
 
 
+XLSX_EXPORT_PARAMETERS = [
+    OpenApiParameter(
+        name='include_norms',
+        type=OpenApiTypes.BOOL,
+        location='query',
+        required=False,
+        description='Включать лист с таблицей нормативов',
+        default=True
+    ),
+    OpenApiParameter(
+        name='include_results',
+        type=OpenApiTypes.BOOL,
+        location='query',
+        required=False,
+        description='Включать сводный лист с итоговыми результатами',
+        default=True
+    ),
+    OpenApiParameter(
+        name='include_standards',
+        type=OpenApiTypes.BOOL,
+        location='query',
+        required=False,
+        description='Включать отдельные листы для каждого норматива',
+        default=True
+    )
+]
+
+
 class TeacherImportExportViewSet(viewsets.ViewSet):
     permission_classes = (IsTeacher,)
 
@@ -358,96 +380,41 @@ class TeacherImportExportViewSet(viewsets.ViewSet):
     )
     @action(detail=False, methods=['get'])
     def export_data(self, request):
-        from students.models import StudentClass
+        from users.export_cache import CachedExport
+        from users.exports import iter_teacher_json
 
         user = request.user
 
-        classes = StudentClass.objects.filter(class_owner=user).prefetch_related('students')
-        standards = Standard.objects.filter(who_added=user).prefetch_related('levels')
-
-        student_ids = []
-        for class_obj in classes:
-            for student in class_obj.students.all():
-                student_ids.append(student.id)
-
-        all_student_standards = StudentStandard.objects.filter(
-            student_id__in=student_ids
-        ).select_related('standard', 'level')
-
-        student_results = {}
-        for result in all_student_standards:
-            if result.student_id not in student_results:
-                student_results[result.student_id] = []
-            student_results[result.student_id].append(result)
+        export = CachedExport(user.id, 'teacher_data.json')
+        cached_file = export.open()
+        if cached_file:
+            response = FileResponse(cached_file, content_type='application/json')
+        else:
+            response = StreamingHttpResponse(export.stream(iter_teacher_json(user)), content_type='application/json')
+        response['Content-Disposition'] = f'attachment; filename="teacher_data_export_{user.id}.json"'
 
-        export_data = {
-            'classes': [],
-            'standards': []
-        }
+        return response
 
-        for standard in standards:
-            standard_data = {
-                'id': standard.id,
-                'name': standard.name,
-                'description': standard.description,
-                'has_numeric_value': standard.has_numeric_value,
-                'levels': []
-            }
+    @extend_schema(
+        summary="Экспортирует данные преподавателя плоскими таблицами",
+        description="ZIP-архив с Parquet-таблицами классов, учеников, нормативов, уровней и результатов "
+                    "с типизированными колонками. Предназначен для аналитической обработки.",
+        responses={(200, 'application/zip'): OpenApiTypes.BINARY}
+    )
+    @action(detail=False, methods=['get'])
+    def export_tables(self, request):
+        from users.export_cache import CachedExport
+        from users.exports import write_teacher_tables
 
-            for level in standard.levels.all():
-                level_data = {
-                    'id': level.id,
-                    'level_number': level.level_number,
-                    'is_lower_better': level.is_lower_better,
-                    'gender': level.gender,
-                    'low_value': level.low_value,
-                    'middle_value': level.middle_value,
-                    'high_value': level.high_value,
-                }
-                standard_data['levels'].append(level_data)
-
-            export_data['standards'].append(standard_data)
-
-        for class_obj in classes:
-            class_data = {
-                'number': class_obj.number,
-                'class_name': class_obj.class_name,
-                'is_archived': class_obj.is_archived,
-                'students': []
-            }
+        user = request.user
 
-            for student in class_obj.students.all():
-                student_data = {
-                    'first_name': student.first_name,
-                    'last_name': student.last_name,
-                    'patronymic': student.patronymic,
-                    'birthday': student.birthday.strftime('%Y-%m-%d'),
-                    'gender': student.gender,
-                    'standards_results': []
-                }
-
-                for result in student_results.get(student.id, []):
-                    result_data = {
-                        'standard_id': result.standard.id,
-                        'standard_name': result.standard.name,
-                        'value': result.value,
-                        'grade': result.grade,
-                        'level_id': result.level.id if result.level else None,
-                        'level_number': result.level.level_number if result.level else None,
-                        'date_recorded': result.date_recorded.strftime('%Y-%m-%d')
-                    }
-                    student_data['standards_results'].append(result_data)
-
-                class_data['students'].append(student_data)
-
-            export_data['classes'].append(class_data)
-
-        response = HttpResponse(
-            json.dumps(export_data, ensure_ascii=False, indent=4),
-            content_type='application/json'
-        )
-        response['Content-Disposition'] = f'attachment; filename="teacher_data_export_{user.id}.json"'
+        export = CachedExport(user.id, 'teacher_tables_parquet.zip')
+        cached_file = export.open()
+        if not cached_file:
+            cached_file = export.write(lambda output: write_teacher_tables(user, output))
 
+        response = FileResponse(cached_file, content_type='application/zip')
+        response['Content-Disposition'] = f'attachment; filename="teacher_data_tables_{user.id}.zip"'
         return response
 
     @extend_schema(
@@ -456,220 +423,33 @@ class TeacherImportExportViewSet(viewsets.ViewSet):
     )
     @action(detail=False, methods=['post'])
     def import_data(self, request):
-        from students.models import StudentClass, Student
+        from users.imports import TeacherDataImporter, ImportDataError
 
         try:
-            if 'file' not in request.FILES:
-                return Response(
-                    {'error': 'Файл не был предоставлен'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-
-            uploaded_file = request.FILES['file']
-            if not uploaded_file.name.endswith('.json'):
-                return Response(
-                    {'error': 'Файл должен быть в формате JSON'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+            uploaded_file, error = self._get_json_file(request)
+            if error:
+                return error
 
-            try:
-                import_data = json.loads(uploaded_file.read().decode('utf-8'))
-            except json.JSONDecodeError:
-                return Response(
-                    {'error': 'Неверный формат JSON-файла'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+            user = request.user
 
-            if 'standards' not in import_data or 'classes' not in import_data:
-                return Response(
-                    {'error': 'Файл не содержит необходимые данные'},
-                    status=status.HTTP_400_BAD_REQUEST
+            def log_progress(processed_classes, total_classes, **stats):
+                logging.info(
+                    'Импорт данных преподавателя %s: обработано классов %s из %s',
+                    user.id, processed_classes, total_classes
                 )
 
-            user = request.user
-
-            with transaction.atomic():
-                existing_standards = {
-                    s.name: s for s in Standard.objects.filter(who_added=user)
-                }
-
-                existing_levels = {}
-                for level in Level.objects.filter(standard__who_added=user):
-                    key = (level.standard_id, level.level_number, level.gender)
-                    existing_levels[key] = level
-
-                existing_classes = {
-                    (c.number, c.class_name): c
-                    for c in StudentClass.objects.filter(class_owner=user)
-                }
-
-                existing_students = {}
-                for student in Student.objects.filter(student_class__class_owner=user):
-                    key = (student.first_name, student.last_name, student.patronymic, student.student_class_id)
-                    existing_students[key] = student
-
-                existing_results = set()
-                for result in StudentStandard.objects.filter(
-                        student__student_class__class_owner=user
-                ).values_list('student_id', 'standard_id', 'date_recorded'):
-                    existing_results.add((result[0], result[1], result[2]))
-
-                imported_standards = 0
-                imported_levels = 0
-                imported_results = 0
-                imported_classes = 0
-                imported_students = 0
-
-                students_mapping = {}
-                standards_mapping = {}
-                levels_mapping = {}
-
-                for standard_data in import_data.get('standards', []):
-                    standard = existing_standards.get(standard_data['name'])
-
-                    if not standard:
-                        standard = Standard(
-                            name=standard_data['name'],
-                            who_added=user,
-                            description=standard_data.get('description', ''),
-                            has_numeric_value=standard_data.get('has_numeric_value', True)
-                        )
-                        standard.save()
-                        existing_standards[standard.name] = standard
-                        imported_standards += 1
-
-                    standards_mapping[standard_data['id']] = standard.id
-
-                    levels_to_create = []
-                    for level_data in standard_data.get('levels', []):
-                        key = (standard.id, level_data['level_number'], level_data['gender'])
-                        if key not in existing_levels:
-                            levels_to_create.append(
-                                Level(
-                                    standard=standard,
-                                    level_number=level_data['level_number'],
-                                    gender=level_data['gender'],
-                                    is_lower_better=level_data.get('is_lower_better', False),
-                                    low_value=level_data.get('low_value'),
-                                    middle_value=level_data.get('middle_value'),
-                                    high_value=level_data.get('high_value')
-                                )
-                            )
-
-                    if levels_to_create:
-                        Level.objects.bulk_create(levels_to_create)
-                        imported_levels += len(levels_to_create)
-
-                        for level in Level.objects.filter(standard=standard):
-                            key = (level.standard_id, level.level_number, level.gender)
-                            existing_levels[key] = level
-                            levels_mapping[level_data['id']] = level.id
-
-                for class_data in import_data.get('classes', []):
-                    key = (class_data['number'], class_data['class_name'])
-                    class_obj = existing_classes.get(key)
-
-                    if not class_obj:
-                        class_obj = StudentClass(
-                            number=class_data['number'],
-                            class_name=class_data['class_name'],
-                            class_owner=user,
-                            is_archived=class_data.get('is_archived', False)
-                        )
-                        class_obj.save()
-                        existing_classes[key] = class_obj
-                        imported_classes += 1
-
-                    students_to_create = []
-                    results_to_create = []
-
-                    for student_data in class_data.get('students', []):
-                        key = (
-                            student_data['first_name'],
-                            student_data['last_name'],
-                            student_data.get('patronymic', ''),
-                            class_obj.id
-                        )
-                        student = existing_students.get(key)
-
-                        if not student:
-                            student = Student(
-                                first_name=student_data['first_name'],
-                                last_name=student_data['last_name'],
-                                patronymic=student_data.get('patronymic', ''),
-                                student_class=class_obj,
-                                birthday=datetime.datetime.strptime(student_data['birthday'], '%Y-%m-%d').date(),
-                                gender=student_data['gender']
-                            )
-                            students_to_create.append(student)
-                            students_mapping[key] = student
-
-                        student_data['key'] = key
-                        student_data['student_obj'] = student
-
-                    if students_to_create:
-                        batch_size = 1000
-                        for i in range(0, len(students_to_create), batch_size):
-                            batch = students_to_create[i:i + batch_size]
-                            Student.objects.bulk_create(batch)
-                            imported_students += len(batch)
-
-                        for key, student in students_mapping.items():
-                            student_refreshed = Student.objects.get(
-                                first_name=student.first_name,
-                                last_name=student.last_name,
-                                patronymic=student.patronymic,
-                                student_class=student.student_class
-                            )
-                            existing_students[key] = student_refreshed
-
-                    for student_data in class_data.get('students', []):
-                        key = student_data['key']
-                        student = existing_students[key]
-
-                        for result_data in student_data.get('standards_results', []):
-                            standard_id = standards_mapping.get(result_data['standard_id'])
-                            level_id = levels_mapping.get(result_data.get('level_id'))
-
-                            if standard_id:
-                                date_recorded = datetime.datetime.strptime(
-                                    result_data['date_recorded'], '%Y-%m-%d'
-                                ).date()
-
-                                result_key = (student.id, standard_id, date_recorded)
-                                if result_key not in existing_results:
-                                    try:
-                                        result = StudentStandard(
-                                            student=student,
-                                            standard_id=standard_id,
-                                            date_recorded=date_recorded,
-                                            level_id=level_id,
-                                            value=result_data['value'],
-                                            grade=result_data['grade']
-                                        )
-                                        results_to_create.append(result)
-                                        existing_results.add(result_key)
-                                        imported_results += 1
-                                    except Exception:
-                                        continue
-
-                    if results_to_create:
-                        batch_size = 1000
-                        for i in range(0, len(results_to_create), batch_size):
-                            batch = results_to_create[i:i + batch_size]
-                            StudentStandard.objects.bulk_create(batch)
-
-                return Response({
-                    'success': True,
-                    'message': (f'Импорт завершен. Добавлено: классов: {imported_classes}, '
-                                f'учеников: {imported_students}, стандартов: {imported_standards}, '
-                                f'уровней: {imported_levels}, результатов: {imported_results}'),
-                    'imported_classes': imported_classes,
-                    'imported_students': imported_students,
-                    'imported_standards': imported_standards,
-                    'imported_levels': imported_levels,
-                    'imported_results': imported_results
-                })
+            try:
+                stats = TeacherDataImporter(user, on_progress=log_progress).run(uploaded_file)
+            except ImportDataError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+            return Response({
+                'success': True,
+                'message': (f'Импорт завершен. Добавлено: классов: {stats["imported_classes"]}, '
+                            f'учеников: {stats["imported_students"]}, стандартов: {stats["imported_standards"]}, '
+                            f'уровней: {stats["imported_levels"]}, результатов: {stats["imported_results"]}'),
+                **stats
+            })
 
         except Exception as e:
             return Response(
@@ -680,241 +460,107 @@ class TeacherImportExportViewSet(viewsets.ViewSet):
     @extend_schema(
         summary="Экспорт данных в формате XLSX",
         description="Создает Excel-файл с данными по нормативам для всех учеников",
-        parameters=[
-            OpenApiParameter(
-                name='include_norms',
-                type=OpenApiTypes.BOOL,
-                location='query',
-                required=False,
-                description='Включать лист с таблицей нормативов',
-                default=True
-            ),
-            OpenApiParameter(
-                name='include_results',
-                type=OpenApiTypes.BOOL,
-                location='query',
-                required=False,
-                description='Включать сводный лист с итоговыми результатами',
-                default=True
-            ),
-            OpenApiParameter(
-                name='include_standards',
-                type=OpenApiTypes.BOOL,
-                location='query',
-                required=False,
-                description='Включать отдельные листы для каждого норматива',
-                default=True
-            )
-        ]
+        parameters=XLSX_EXPORT_PARAMETERS
     )
     @action(detail=False, methods=['get'])
     def export_xlsx(self, request):
-        from students.models import StudentClass
+        from users.export_cache import CachedExport
+        from users.exports import write_teacher_xlsx
 
-        include_norms = request.query_params.get('include_norms', 'true').lower() == 'true'
-        include_results = request.query_params.get('include_results', 'true').lower() == 'true'
-        include_standards = request.query_params.get('include_standards', 'true').lower() == 'true'
+        options = self._xlsx_options(request)
+        flags = ''.join('1' if enabled else '0' for enabled in options.values())
 
-        user = request.user
-        standards = Standard.objects.filter(who_added=user)
-        classes = StudentClass.objects.filter(class_owner=user)
+        export = CachedExport(request.user.id, f'standards_export-{flags}.xlsx')
+        cached_file = export.open()
+        if not cached_file:
+            cached_file = export.write(lambda output: write_teacher_xlsx(request.user, output, **options))
 
-        output = io.BytesIO()
+        response = FileResponse(
+            cached_file,
+            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        )
+        response['Content-Disposition'] = 'attachment; filename="standards_export.xlsx"'
+        return response
 
-        with pd.ExcelWriter(output,engine_kwargs={"options": {"nan_inf_to_errors": True}}, engine='xlsxwriter') as writer:
-            formats = create_excel_formats(writer.book)
+    @staticmethod
+    def _xlsx_options(request):
+        return {
+            option: request.query_params.get(option, 'true').lower() == 'true'
+            for option in ('include_norms', 'include_results', 'include_standards')
+        }
 
-            if include_norms:
-                self._create_norms_table(writer, standards, formats)
+    @staticmethod
+    def _get_json_file(request):
+        """Возвращает загруженный JSON-файл или ответ с ошибкой"""
+        if 'file' not in request.FILES:
+            return None, Response(
+                {'error': 'Файл не был предоставлен'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-            if include_results:
-                self._create_results_sheet(writer, standards, classes, formats)
+        uploaded_file = request.FILES['file']
+        if not uploaded_file.name.endswith('.json'):
+            return None, Response(
+                {'error': 'Файл должен быть в формате JSON'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
 
-            if include_standards:
-                for standard in standards:
-                    self._create_standard_sheet(writer, standard, classes, formats)
+        return uploaded_file, None
 
-        output.seek(0)
-        response = HttpResponse(
-            output.read(),
-            content_type='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
-        )
-        response['Content-Disposition'] = 'attachment; filename="standards_export.xlsx"'
-        return response
+    @extend_schema(
+        summary="Запускает фоновый импорт данных преподавателя из JSON-файла",
+        description="Возвращает задачу, статус и прогресс которой доступны через /jobs/{id}/",
+        responses={202: JobSerializer}
+    )
+    @action(detail=False, methods=['post'])
+    def import_data_job(self, request):
+        from users.tasks import import_data_job_task
+
+        uploaded_file, error = self._get_json_file(request)
+        if error:
+            return error
+
+        job = models.Job(owner=request.user, kind='import_data')
+        job.input_file.save(uploaded_file.name, uploaded_file)
+
+        transaction.on_commit(lambda: import_data_job_task.delay(job.id))
+        return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+    @extend_schema(
+        summary="Запускает фоновый экспорт данных в формате XLSX",
+        description="Возвращает задачу, результат которой можно скачать через /jobs/{id}/download/",
+        parameters=XLSX_EXPORT_PARAMETERS,
+        responses={202: JobSerializer}
+    )
+    @action(detail=False, methods=['post'])
+    def export_xlsx_job(self, request):
+        from users.tasks import export_xlsx_job_task
+
+        job = models.Job.objects.create(owner=request.user, kind='export_xlsx', params=self._xlsx_options(request))
+
+        transaction.on_commit(lambda: export_xlsx_job_task.delay(job.id))
+        return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
+
+
+class JobViewSet(mixins.ListModelMixin, mixins.RetrieveModelMixin, viewsets.GenericViewSet):
+    """Статус, прогресс и результаты фоновых задач импорта/экспорта преподавателя"""
+    permission_classes = (IsTeacher,)
+    serializer_class = JobSerializer
+
+    def get_queryset(self):
+        return models.Job.objects.filter(owner=self.request.user)
+
+    @extend_schema(
+        summary="Скачивает результат завершенной фоновой задачи",
+        responses={(200, 'application/octet-stream'): OpenApiTypes.BINARY}
+    )
+    @action(detail=True, methods=['get'])
+    def download(self, request, pk=None):
+        job = self.get_object()
+        if job.status != 'success' or not job.artifact:
+            return Response(
+                {'error': 'Результат задачи еще не готов'},
+                status=status.HTTP_409_CONFLICT
+            )
 
-    def _create_norms_table(self, writer, standards, formats):
-        """Создает лист с таблицей нормативов."""
-        norm_data = []
-        columns = ["норматив"]
-        for class_num in range(1, 12):
-            for gender in ['мальчики', 'девочки']:
-                for level in ['повышенный', 'высокий', 'средний']:
-                    columns.append(f"{class_num} класс {gender} {level}")
-
-        standards_filtered = standards.filter(has_numeric_value=True)
-        levels = Level.objects.filter(standard__in=standards_filtered).select_related('standard')
-        levels_dict = {}
-        for level in levels:
-            key = (level.standard.id, level.level_number, level.gender)
-            levels_dict[key] = level
-
-        for standard in standards_filtered:
-            row = [standard.name]
-            for class_num in range(1, 12):
-                for gender in ['m', 'f']:
-                    level = levels_dict.get((standard.id, class_num, gender))
-                    if level:
-                        row.extend([level.high_value, level.middle_value, level.low_value])
-                    else:
-                        row.extend([None, None, None])
-            norm_data.append(row)
-
-        df_norms = pd.DataFrame(norm_data, columns=columns)
-        df_norms = df_norms.replace([float('inf'), -float('inf'), pd.NA, pd.NaT], None)
-
-        df_norms.to_excel(writer, sheet_name="Таблица нормативов", index=False)
-
-        worksheet = writer.sheets["Таблица нормативов"]
-        worksheet.set_column(0, 0, 30)
-        worksheet.set_column(1, len(columns), 12)
-
-        write_headers_and_data(worksheet, df_norms, formats)
-
-    def _create_results_sheet(self, writer, standards, classes, formats):
-        """Создает сводный лист с итоговыми результатами всех студентов."""
-        from students.models import Student
-
-        students = Student.objects.filter(student_class__in=classes).select_related(
-            'student_class').order_by(
-            'student_class__number', 'student_class__class_name', 'last_name', 'first_name')
-
-        student_ids = [student.id for student in students]
-        all_results = StudentStandard.objects.filter(
-            student_id__in=student_ids,
-            standard__in=standards
-        ).select_related('level', 'standard').order_by('-date_recorded')
-
-        results_map = {}
-        for result in all_results:
-            if result.level:
-                key = (result.student_id, result.standard_id, result.level.level_number)
-                if key not in results_map:
-                    results_map[key] = result
-
-        data = []
-        columns = ["№", "ФИО", "Пол", "Класс", "Дата рождения"]
-
-        for class_num in range(1, 12):
-            columns.append(f"Итого {class_num} класс")
-
-        for i, student in enumerate(students, 1):
-            gender_display = "ж" if student.gender == 'f' else "м"
-            class_name = f"{student.student_class.number}{student.student_class.class_name}"
-
-            row = [
-                i,
-                f"{student.full_name}",
-                gender_display,
-                class_name,
-                student.birthday.strftime("%d.%m.%Y")
-            ]
-
-            for class_num in range(1, 12):
-                class_grades = []
-
-                for standard in standards:
-                    key = (student.id, standard.id, class_num)
-                    if key in results_map and results_map[key].grade is not None:
-                        class_grades.append(results_map[key].grade)
-
-                if class_grades:
-                    try:
-                        avg_class_grade = sum(class_grades) / len(class_grades)
-                        row.append(round(avg_class_grade, 1))
-                    except (OverflowError, ValueError):
-                        row.append(None)
-                else:
-                    row.append('')
-
-            data.append(row)
-
-        df = pd.DataFrame(data, columns=columns)
-        df = df.replace([float('inf'), -float('inf'), pd.NA, pd.NaT], None)
-
-        df.to_excel(writer, sheet_name="Итоговые результаты", index=False)
-
-        worksheet = writer.sheets["Итоговые результаты"]
-        worksheet.set_column(0, 0, 5)
-        worksheet.set_column(1, 1, 25)
-        worksheet.set_column(2, 2, 6)
-        worksheet.set_column(3, 3, 8)
-        worksheet.set_column(4, 4, 15)
-        worksheet.set_column(5, len(columns), 15)
-
-        write_headers_and_data(worksheet, df, formats, gender_col=2)
-
-    def _create_standard_sheet(self, writer, standard, classes, formats):
-        """Создает лист для конкретного норматива."""
-        from students.models import Student
-
-        students = Student.objects.filter(student_class__in=classes).select_related(
-            'student_class').order_by('student_class__number', 'student_class__class_name')
-
-        student_ids = [student.id for student in students]
-        results = StudentStandard.objects.filter(
-            student_id__in=student_ids,
-            standard=standard
-        ).select_related('level').order_by('level__level_number')
-
-        results_by_student = {}
-        for result in results:
-            if not result.level:
-                continue
-            if result.student_id not in results_by_student:
-                results_by_student[result.student_id] = {}
-            results_by_student[result.student_id][result.level.level_number] = result
-
-        student_data = []
-        columns = ["№", "ФИО", "пол", "класс", "д.р."]
-        for class_num in range(1, 12):
-            columns.append(str(class_num))
-            columns.append(f"{class_num}ур")
-
-        for i, student in enumerate(students, 1):
-            gender_display = "ж" if student.gender == 'f' else "м"
-            class_name = f"{student.student_class.number}{student.student_class.class_name}"
-
-            row = [
-                i,
-                f"{student.full_name}",
-                gender_display,
-                class_name,
-                student.birthday.strftime("%d.%m.%Y")
-            ]
-
-            student_results = results_by_student.get(student.id, {})
-
-            for class_num in range(1, 12):
-                if class_num in student_results:
-                    result = student_results[class_num]
-                    value = result.value if result.value not in (float('inf'), -float('inf')) else None
-                    row.append(value)
-                    row.append(result.grade)
-                else:
-                    row.append(0)
-                    row.append('')
-
-            student_data.append(row)
-
-        df_students = pd.DataFrame(student_data, columns=columns)
-        df_students = df_students.replace([float('inf'), -float('inf'), pd.NA, pd.NaT], None)
-
-        sheet_name = standard.name[:31]
-        df_students.to_excel(writer, sheet_name=sheet_name, index=False)
-
-        worksheet = writer.sheets[sheet_name]
-        worksheet.set_column(0, 0, 5)
-        worksheet.set_column(1, 1, 25)
-        worksheet.set_column(2, len(columns), 10)
-
-        write_headers_and_data(worksheet, df_students, formats, gender_col=2)
+        return FileResponse(job.artifact.open('rb'), as_attachment=True, filename=job.artifact_name)
@@ -0,0 +1,93 @@
+import glob
+import os
+import tempfile
+import uuid
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+DATA_VERSION_CACHE_KEY = "export_data_version:{teacher_id}"
+
+
+def get_data_version(teacher_id):
+    """Текущая версия данных преподавателя. Меняется при любом изменении его данных."""
+    key = DATA_VERSION_CACHE_KEY.format(teacher_id=teacher_id)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, uuid.uuid4().hex, None)
+        version = cache.get(key)
+    return version
+
+
+def bump_data_version(teacher_id):
+    """Меняет версию данных преподавателя после фиксации текущей транзакции."""
+    key = DATA_VERSION_CACHE_KEY.format(teacher_id=teacher_id)
+    transaction.on_commit(lambda: cache.set(key, uuid.uuid4().hex, None))
+
+
+def bump_data_versions(teacher_ids):
+    """Меняет версию данных сразу для нескольких преподавателей."""
+    for teacher_id in set(teacher_ids):
+        if teacher_id is not None:
+            bump_data_version(teacher_id)
+
+
+class CachedExport:
+    """
+    Файл экспорта преподавателя, сохраненный на диске для текущей версии его данных.
+
+    Версия фиксируется при создании объекта, до чтения данных из базы, поэтому
+    изменения, сделанные во время формирования файла, приведут к новой версии
+    и файл будет сформирован заново при следующем запросе.
+    """
+
+    def __init__(self, teacher_id, name):
+        self.directory = os.path.join(settings.EXPORT_CACHE_ROOT, str(teacher_id))
+        self.name = name
+        self.path = os.path.join(self.directory, f'{name}.{get_data_version(teacher_id)}')
+
+    def open(self):
+        """Открывает сохраненный файл на чтение или возвращает None, если его нет."""
+        try:
+            return open(self.path, 'rb')
+        except FileNotFoundError:
+            return None
+
+    def write(self, writer):
+        """Формирует файл через writer(file), сохраняет его в кэш и возвращает открытым на чтение."""
+        with self._temporary_file() as output:
+            writer(output)
+            output.flush()
+            # Файл открывается до переименования, чтобы его не удалил параллельный сброс кэша
+            result = open(output.name, 'rb')
+        return result
+
+    def stream(self, chunks):
+        """Отдает строки chunks и параллельно сохраняет их в кэш, если поток прочитан до конца."""
+        with self._temporary_file() as output:
+            for chunk in chunks:
+                output.write(chunk.encode('utf-8'))
+                yield chunk
+
+    @contextmanager
+    def _temporary_file(self):
+        """Временный файл, который заменяет кэшированный при успешном завершении и удаляется при ошибке."""
+        os.makedirs(self.directory, exist_ok=True)
+        output = tempfile.NamedTemporaryFile(dir=self.directory, prefix='.tmp-', delete=False)
+        try:
+            with output:
+                yield output
+        except BaseException:
+            os.remove(output.name)
+            raise
+
+        os.replace(output.name, self.path)
+
+        for stale_path in glob.glob(os.path.join(glob.escape(self.directory), f'{glob.escape(self.name)}.*')):
+            if stale_path != self.path:
+                try:
+                    os.remove(stale_path)
+                except FileNotFoundError:
+                    pass
@@ -0,0 +1,387 @@
+import json
+import zipfile
+from itertools import islice
+
+import xlsxwriter
+
+from common.excel_utils import create_excel_formats, write_headers, write_data_row
+from standards.models import Standard, StudentStandard, Level
+from students.models import Student, StudentClass
+
+EXPORT_CHUNK_SIZE = 2000
+
+
+class _SortedRows:
+    """
+    Обертка над итератором строк, отсортированных по ключу.
+    Позволяет последовательно забирать строки группы с нужным значением ключа.
+    """
+
+    def __init__(self, rows, key):
+        self._rows = iter(rows)
+        self._key = key
+        self._current = next(self._rows, None)
+
+    def take(self, value):
+        while self._current is not None and self._key(self._current) == value:
+            yield self._current
+            self._current = next(self._rows, None)
+
+
+def _dumps(data):
+    return json.dumps(data, ensure_ascii=False)
+
+
+def iter_teacher_json(user, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Формирует JSON-экспорт данных преподавателя по частям.
+
+    Нормативы, классы, ученики и результаты читаются серверными курсорами
+    (.iterator) в одном порядке сортировки и объединяются на лету,
+    поэтому в памяти одновременно находится только один ученик с его результатами.
+    """
+    standards = Standard.objects.filter(who_added=user).prefetch_related('levels').order_by('id')
+    classes = StudentClass.objects.filter(class_owner=user).order_by('number', 'class_name', 'id')
+    students = Student.objects.filter(student_class__in=classes).order_by(
+        'student_class__number', 'student_class__class_name', 'student_class_id', 'id'
+    )
+    results = StudentStandard.objects.filter(student__in=students).order_by(
+        'student__student_class__number', 'student__student_class__class_name',
+        'student__student_class_id', 'student_id', 'id'
+    ).values(
+        'student_id', 'standard_id', 'standard__name', 'value', 'grade',
+        'level_id', 'level__level_number', 'date_recorded'
+    )
+
+    yield '{"standards": ['
+    for index, standard in enumerate(standards.iterator(chunk_size=chunk_size)):
+        standard_data = {
+            'id': standard.id,
+            'name': standard.name,
+            'description': standard.description,
+            'has_numeric_value': standard.has_numeric_value,
+            'levels': [
+                {
+                    'id': level.id,
+                    'level_number': level.level_number,
+                    'is_lower_better': level.is_lower_better,
+                    'gender': level.gender,
+                    'low_value': level.low_value,
+                    'middle_value': level.middle_value,
+                    'high_value': level.high_value,
+                }
+                for level in standard.levels.all()
+            ]
+        }
+        yield (', ' if index else '') + _dumps(standard_data)
+
+    yield '], "classes": ['
+
+    students_rows = _SortedRows(students.iterator(chunk_size=chunk_size), key=lambda s: s.student_class_id)
+    results_rows = _SortedRows(results.iterator(chunk_size=chunk_size), key=lambda r: r['student_id'])
+
+    for class_index, class_obj in enumerate(classes.iterator(chunk_size=chunk_size)):
+        class_header = _dumps({
+            'number': class_obj.number,
+            'class_name': class_obj.class_name,
+            'is_archived': class_obj.is_archived,
+        })
+        yield (', ' if class_index else '') + class_header[:-1] + ', "students": ['
+
+        for student_index, student in enumerate(students_rows.take(class_obj.id)):
+            student_data = {
+                'first_name': student.first_name,
+                'last_name': student.last_name,
+                'patronymic': student.patronymic,
+                'birthday': student.birthday.strftime('%Y-%m-%d'),
+                'gender': student.gender,
+                'standards_results': [
+                    {
+                        'standard_id': result['standard_id'],
+                        'standard_name': result['standard__name'],
+                        'value': result['value'],
+                        'grade': result['grade'],
+                        'level_id': result['level_id'],
+                        'level_number': result['level__level_number'],
+                        'date_recorded': result['date_recorded'].strftime('%Y-%m-%d')
+                    }
+                    for result in results_rows.take(student.id)
+                ]
+            }
+            yield (', ' if student_index else '') + _dumps(student_data)
+
+        yield ']}'
+
+    yield ']}'
+
+
+class _ResultsIndex:
+    """
+    Ученики и результаты преподавателя для XLSX-экспорта, загруженные одним проходом.
+    Для каждой тройки (ученик, норматив, номер уровня) хранится последний по дате результат.
+    """
+
+    def __init__(self, standards, classes):
+        students = Student.objects.filter(student_class__in=classes)
+        self.students = list(
+            students.select_related('student_class').order_by(
+                'student_class__number', 'student_class__class_name', 'last_name', 'first_name'
+            ).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+        )
+
+        results = StudentStandard.objects.filter(
+            student__in=students,
+            standard__in=standards,
+            level__isnull=False,
+        ).order_by('-date_recorded', '-id').values_list(
+            'student_id', 'standard_id', 'level__level_number', 'value', 'grade'
+        )
+
+        self._results = {}
+        for student_id, standard_id, level_number, value, grade in results.iterator(chunk_size=EXPORT_CHUNK_SIZE):
+            self._results.setdefault((student_id, standard_id, level_number), (value, grade))
+
+    def get(self, student_id, standard_id, level_number):
+        """Возвращает пару (значение, оценка) или None, если результата нет"""
+        return self._results.get((student_id, standard_id, level_number))
+
+
+# Плоские таблицы колоночного экспорта: (колонка, поле модели, тип Arrow)
+TABLE_COLUMNS = {
+    'classes': (
+        ('id', 'id', 'int64'),
+        ('number', 'number', 'int64'),
+        ('class_name', 'class_name', 'string'),
+        ('is_archived', 'is_archived', 'bool'),
+    ),
+    'students': (
+        ('id', 'id', 'int64'),
+        ('class_id', 'student_class_id', 'int64'),
+        ('first_name', 'first_name', 'string'),
+        ('last_name', 'last_name', 'string'),
+        ('patronymic', 'patronymic', 'string'),
+        ('birthday', 'birthday', 'date32'),
+        ('gender', 'gender', 'string'),
+    ),
+    'standards': (
+        ('id', 'id', 'int64'),
+        ('name', 'name', 'string'),
+        ('description', 'description', 'string'),
+        ('has_numeric_value', 'has_numeric_value', 'bool'),
+    ),
+    'levels': (
+        ('id', 'id', 'int64'),
+        ('standard_id', 'standard_id', 'int64'),
+        ('level_number', 'level_number', 'int64'),
+        ('gender', 'gender', 'string'),
+        ('is_lower_better', 'is_lower_better', 'bool'),
+        ('low_value', 'low_value', 'float64'),
+        ('middle_value', 'middle_value', 'float64'),
+        ('high_value', 'high_value', 'float64'),
+    ),
+    'results': (
+        ('id', 'id', 'int64'),
+        ('student_id', 'student_id', 'int64'),
+        ('standard_id', 'standard_id', 'int64'),
+        ('level_id', 'level_id', 'int64'),
+        ('value', 'value', 'float64'),
+        ('grade', 'grade', 'int64'),
+        ('date_recorded', 'date_recorded', 'date32'),
+    ),
+}
+
+
+def write_teacher_tables(user, output, chunk_size=EXPORT_CHUNK_SIZE):
+    """
+    Записывает в output ZIP-архив с плоскими таблицами данных преподавателя для аналитики.
+
+    Каждая таблица из TABLE_COLUMNS сохраняется отдельным Parquet-файлом со схемой
+    из типов колонок, строки читаются и записываются пачками по chunk_size.
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    classes = StudentClass.objects.filter(class_owner=user)
+    students = Student.objects.filter(student_class__in=classes)
+    standards = Standard.objects.filter(who_added=user)
+    tables = {
+        'classes': classes,
+        'students': students,
+        'standards': standards,
+        'levels': Level.objects.filter(standard__in=standards),
+        'results': StudentStandard.objects.filter(student__in=students),
+    }
+
+    # Parquet сжат сам по себе, поэтому файлы кладутся в архив без сжатия
+    with zipfile.ZipFile(output, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for name, columns in TABLE_COLUMNS.items():
+            schema = pa.schema([
+                (column, pa.type_for_alias(column_type)) for column, _, column_type in columns
+            ])
+            rows = tables[name].order_by('id').values_list(
+                *(field for _, field, _ in columns)
+            ).iterator(chunk_size=chunk_size)
+
+            with archive.open(f'{name}.parquet', 'w', force_zip64=True) as table_file:
+                with pq.ParquetWriter(table_file, schema) as writer:
+                    while batch := list(islice(rows, chunk_size)):
+                        writer.write_batch(pa.record_batch(
+                            [pa.array(values, type=field.type) for values, field in zip(zip(*batch), schema)],
+                            schema=schema,
+                        ))
+
+
+def write_teacher_xlsx(user, output, include_norms=True, include_results=True, include_standards=True,
+                       on_progress=None):
+    """
+    Записывает в output Excel-файл с данными по нормативам для всех учеников преподавателя.
+
+    Ученики и результаты загружаются один раз и используются всеми листами.
+    Строки пишутся напрямую в xlsxwriter в режиме constant_memory: каждая строка
+    сбрасывается на диск сразу после записи, поэтому файл не собирается в памяти.
+    После каждого листа вызывается on_progress(processed_sheets, total_sheets).
+    """
+    standards = Standard.objects.filter(who_added=user)
+    classes = StudentClass.objects.filter(class_owner=user)
+
+    sheet_standards = list(standards) if include_standards else []
+    total_sheets = int(include_norms) + int(include_results) + len(sheet_standards)
+    processed_sheets = 0
+
+    index = _ResultsIndex(standards, classes) if include_results or sheet_standards else None
+
+    def sheet_done():
+        nonlocal processed_sheets
+        processed_sheets += 1
+        if on_progress:
+            on_progress(processed_sheets=processed_sheets, total_sheets=total_sheets)
+
+    with xlsxwriter.Workbook(output, {'constant_memory': True, 'nan_inf_to_errors': True}) as workbook:
+        formats = create_excel_formats(workbook)
+
+        if include_norms:
+            _create_norms_table(workbook, standards, formats)
+            sheet_done()
+
+        if include_results:
+            _create_results_sheet(workbook, standards, index, formats)
+            sheet_done()
+
+        for standard in sheet_standards:
+            _create_standard_sheet(workbook, standard, index, formats)
+            sheet_done()
+
+
+def _student_cells(row_num, student):
+    gender_display = "ж" if student.gender == 'f' else "м"
+    class_name = f"{student.student_class.number}{student.student_class.class_name}"
+
+    return [
+        row_num,
+        f"{student.full_name}",
+        gender_display,
+        class_name,
+        student.birthday.strftime("%d.%m.%Y")
+    ]
+
+
+def _create_norms_table(workbook, standards, formats):
+    """Создает лист с таблицей нормативов."""
+    columns = ["норматив"]
+    for class_num in range(1, 12):
+        for gender in ['мальчики', 'девочки']:
+            for level in ['повышенный', 'высокий', 'средний']:
+                columns.append(f"{class_num} класс {gender} {level}")
+
+    worksheet = workbook.add_worksheet("Таблица нормативов")
+    worksheet.set_column(0, 0, 30)
+    worksheet.set_column(1, len(columns), 12)
+    write_headers(worksheet, columns, formats)
+
+    standards_filtered = standards.filter(has_numeric_value=True)
+    levels = Level.objects.filter(standard__in=standards_filtered)
+    levels_dict = {}
+    for level in levels:
+        key = (level.standard_id, level.level_number, level.gender)
+        levels_dict[key] = level
+
+    for row_num, standard in enumerate(standards_filtered, 1):
+        row = [standard.name]
+        for class_num in range(1, 12):
+            for gender in ['m', 'f']:
+                level = levels_dict.get((standard.id, class_num, gender))
+                if level:
+                    row.extend([level.high_value, level.middle_value, level.low_value])
+                else:
+                    row.extend([None, None, None])
+
+        write_data_row(worksheet, row_num, row, formats)
+
+
+def _create_results_sheet(workbook, standards, index, formats):
+    """Создает сводный лист с итоговыми результатами всех студентов."""
+    standard_ids = [standard.id for standard in standards]
+
+    columns = ["№", "ФИО", "Пол", "Класс", "Дата рождения"]
+    for class_num in range(1, 12):
+        columns.append(f"Итого {class_num} класс")
+
+    worksheet = workbook.add_worksheet("Итоговые результаты")
+    worksheet.set_column(0, 0, 5)
+    worksheet.set_column(1, 1, 25)
+    worksheet.set_column(2, 2, 6)
+    worksheet.set_column(3, 3, 8)
+    worksheet.set_column(4, 4, 15)
+    worksheet.set_column(5, len(columns), 15)
+    write_headers(worksheet, columns, formats)
+
+    for i, student in enumerate(index.students, 1):
+        row = _student_cells(i, student)
+
+        for class_num in range(1, 12):
+            class_grades = []
+
+            for standard_id in standard_ids:
+                result = index.get(student.id, standard_id, class_num)
+                if result and result[1] is not None:
+                    class_grades.append(result[1])
+
+            if class_grades:
+                try:
+                    avg_class_grade = sum(class_grades) / len(class_grades)
+                    row.append(round(avg_class_grade, 1))
+                except (OverflowError, ValueError):
+                    row.append(None)
+            else:
+                row.append('')
+
+        write_data_row(worksheet, i, row, formats, gender_col=2)
+
+
+def _create_standard_sheet(workbook, standard, index, formats):
+    """Создает лист для конкретного норматива."""
+    columns = ["№", "ФИО", "пол", "класс", "д.р."]
+    for class_num in range(1, 12):
+        columns.append(str(class_num))
+        columns.append(f"{class_num}ур")
+
+    worksheet = workbook.add_worksheet(standard.name[:31])
+    worksheet.set_column(0, 0, 5)
+    worksheet.set_column(1, 1, 25)
+    worksheet.set_column(2, len(columns), 10)
+    write_headers(worksheet, columns, formats)
+
+    for i, student in enumerate(index.students, 1):
+        row = _student_cells(i, student)
+
+        for class_num in range(1, 12):
+            result = index.get(student.id, standard.id, class_num)
+            if result:
+                value, grade = result
+                row.append(value if value not in (float('inf'), -float('inf')) else None)
+                row.append(grade)
+            else:
+                row.append(0)
+                row.append('')
+
+        write_data_row(worksheet, i, row, formats, gender_col=2)
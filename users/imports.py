@@ -0,0 +1,298 @@
+import datetime
+
+from django.conf import settings
+from django.db import transaction
+
+from common.bulk_signals import bulk_signals
+from common.json_stream import iter_json_object, JSONStreamError
+from standards.grading import GradingRules, get_grading_rules, invalidate_grading_rules, load_grading_rules
+from standards.models import Standard, StudentStandard, Level
+from students.models import Student, StudentClass
+from users.export_cache import bump_data_version
+
+IMPORT_BULK_BATCH_SIZE = 1000
+
+
+class ImportDataError(ValueError):
+    """Файл импорта не может быть обработан"""
+
+
+class TeacherDataImporter:
+    """
+    Импорт данных преподавателя из JSON-файла, полученного через export_data.
+
+    Файл читается потоково в два прохода: первый проверяет формат и загружает
+    нормативы, второй обрабатывает классы пакетами по batch_size, каждый пакет
+    фиксируется в отдельной транзакции. После каждого пакета вызывается
+    on_progress со статистикой импорта.
+    """
+
+    def __init__(self, user, batch_size=None, on_progress=None):
+        self.user = user
+        self.batch_size = batch_size or settings.TEACHER_IMPORT_BATCH_SIZE
+        self.on_progress = on_progress
+
+        self.stats = {
+            'imported_classes': 0,
+            'imported_students': 0,
+            'imported_standards': 0,
+            'imported_levels': 0,
+            'imported_results': 0,
+        }
+        self.total_classes = 0
+        self.processed_classes = 0
+
+        self.rules = None
+        self.existing_classes = {}
+        self.standards_mapping = {}
+        self.levels_mapping = {}
+
+    def run(self, file):
+        standards_data = self._read_standards(file)
+
+        with transaction.atomic():
+            self._import_standards(standards_data)
+            bump_data_version(self.user.id)
+
+        self.existing_classes = {
+            (c.number, c.class_name): c
+            for c in StudentClass.objects.filter(class_owner=self.user)
+        }
+
+        file.seek(0)
+        batch = []
+        for class_data in self._iter_items(file, 'classes'):
+            batch.append(class_data)
+            if len(batch) >= self.batch_size:
+                self._import_batch(batch)
+                batch = []
+
+        if batch:
+            self._import_batch(batch)
+
+        return self.stats
+
+    @staticmethod
+    def _iter_items(file, key):
+        current_key = None
+        try:
+            for event, value in iter_json_object(file):
+                if event == 'key':
+                    current_key = value
+                elif event == 'item' and current_key == key:
+                    yield value
+        except JSONStreamError as e:
+            raise ImportDataError('Неверный формат JSON-файла') from e
+
+    def _read_standards(self, file):
+        """Проверяет весь файл и возвращает список нормативов из него"""
+        keys = set()
+        standards_data = []
+        current_key = None
+
+        file.seek(0)
+        try:
+            for event, value in iter_json_object(file):
+                if event == 'key':
+                    current_key = value
+                    keys.add(value)
+                elif event == 'item' and current_key == 'standards':
+                    standards_data.append(value)
+                elif event == 'item' and current_key == 'classes':
+                    self.total_classes += 1
+        except JSONStreamError as e:
+            raise ImportDataError('Неверный формат JSON-файла') from e
+
+        if 'standards' not in keys or 'classes' not in keys:
+            raise ImportDataError('Файл не содержит необходимые данные')
+
+        return standards_data
+
+    def _import_standards(self, standards_data):
+        existing_standards = {
+            s.name: s for s in Standard.objects.filter(who_added=self.user)
+        }
+
+        self.rules = get_grading_rules(self.user.id)
+
+        for standard_data in standards_data:
+            standard = existing_standards.get(standard_data['name'])
+
+            if not standard:
+                standard = Standard(
+                    name=standard_data['name'],
+                    who_added=self.user,
+                    description=standard_data.get('description', ''),
+                    has_numeric_value=standard_data.get('has_numeric_value', True)
+                )
+                standard.save()
+                existing_standards[standard.name] = standard
+                self.stats['imported_standards'] += 1
+
+            self.standards_mapping[standard_data['id']] = standard.id
+
+            levels_to_create = []
+            for level_data in standard_data.get('levels', []):
+                level = self.rules.get(standard.id, level_data['level_number'], level_data['gender'])
+                if not level:
+                    level = Level(
+                        standard=standard,
+                        level_number=level_data['level_number'],
+                        gender=level_data['gender'],
+                        is_lower_better=level_data.get('is_lower_better', False),
+                        low_value=level_data.get('low_value'),
+                        middle_value=level_data.get('middle_value'),
+                        high_value=level_data.get('high_value')
+                    )
+                    levels_to_create.append(level)
+                level_data['level_obj'] = level
+
+            if levels_to_create:
+                Level.objects.bulk_create(levels_to_create)
+                self.stats['imported_levels'] += len(levels_to_create)
+
+            for level_data in standard_data.get('levels', []):
+                self.levels_mapping[level_data['id']] = level_data['level_obj'].id
+
+        if self.stats['imported_standards'] or self.stats['imported_levels']:
+            invalidate_grading_rules(self.user.id)
+            # Кэш сбрасывается только после фиксации транзакции, поэтому уровни читаются из базы
+            self.rules = GradingRules(load_grading_rules(self.user.id))
+
+    def _import_batch(self, classes_data):
+        with transaction.atomic(), bulk_signals():
+            self._import_classes(classes_data)
+            bump_data_version(self.user.id)
+
+        self.processed_classes += len(classes_data)
+        if self.on_progress:
+            self.on_progress(
+                processed_classes=self.processed_classes,
+                total_classes=self.total_classes,
+                **self.stats
+            )
+
+    def _import_classes(self, classes_data):
+        class_objects = []
+        for class_data in classes_data:
+            key = (class_data['number'], class_data['class_name'])
+            class_obj = self.existing_classes.get(key)
+
+            if not class_obj:
+                class_obj = StudentClass(
+                    number=class_data['number'],
+                    class_name=class_data['class_name'],
+                    class_owner=self.user,
+                    is_archived=class_data.get('is_archived', False)
+                )
+                class_obj.save()
+                self.existing_classes[key] = class_obj
+                self.stats['imported_classes'] += 1
+
+            class_objects.append(class_obj)
+
+        existing_students = {}
+        for student in Student.objects.filter(student_class__in=class_objects):
+            key = (student.first_name, student.last_name, student.patronymic, student.student_class_id)
+            existing_students[key] = student
+
+        # Записи с уровнем уникальны по ученику, нормативу и уровню: среди них могут быть
+        # пустые заготовки, созданные сигналами, их значения заполняются из файла
+        existing_results = {}
+        existing_dated_results = set()
+        for pk, student_id, standard_id, level_id, date_recorded, value in StudentStandard.objects.filter(
+            student__student_class__in=class_objects
+        ).values_list('id', 'student_id', 'standard_id', 'level_id', 'date_recorded', 'value'):
+            if level_id:
+                existing_results[(student_id, standard_id, level_id)] = (pk, value)
+            else:
+                existing_dated_results.add((student_id, standard_id, date_recorded))
+
+        students_to_create = []
+        for class_data, class_obj in zip(classes_data, class_objects):
+            for student_data in class_data.get('students', []):
+                key = (
+                    student_data['first_name'],
+                    student_data['last_name'],
+                    student_data.get('patronymic', ''),
+                    class_obj.id
+                )
+                student = existing_students.get(key)
+
+                if not student:
+                    student = Student(
+                        first_name=student_data['first_name'],
+                        last_name=student_data['last_name'],
+                        patronymic=student_data.get('patronymic', ''),
+                        student_class=class_obj,
+                        birthday=datetime.datetime.strptime(student_data['birthday'], '%Y-%m-%d').date(),
+                        gender=student_data['gender']
+                    )
+                    students_to_create.append(student)
+                    existing_students[key] = student
+
+                student_data['student_obj'] = student
+
+        if students_to_create:
+            # PostgreSQL возвращает первичные ключи из bulk_create, повторно читать учеников не нужно
+            Student.objects.bulk_create(students_to_create, batch_size=IMPORT_BULK_BATCH_SIZE)
+            self.stats['imported_students'] += len(students_to_create)
+
+        results = {}
+        for class_data in classes_data:
+            for student_data in class_data.get('students', []):
+                student = student_data['student_obj']
+
+                for result_data in student_data.get('standards_results', []):
+                    standard_id = self.standards_mapping.get(result_data['standard_id'])
+                    level_id = self.levels_mapping.get(result_data.get('level_id'))
+
+                    if standard_id:
+                        date_recorded = datetime.datetime.strptime(
+                            result_data['date_recorded'], '%Y-%m-%d'
+                        ).date()
+
+                        existing_pk = None
+                        if level_id:
+                            result_key = (student.id, standard_id, level_id)
+                            existing_pk, existing_value = existing_results.get(result_key, (None, None))
+                            # Уже сохраненное значение не перезаписывается, из повторов в файле берется последний
+                            if existing_value is not None:
+                                continue
+                            if result_key in results and results[result_key].date_recorded >= date_recorded:
+                                continue
+                        else:
+                            result_key = (student.id, standard_id, date_recorded)
+                            if result_key in existing_dated_results or result_key in results:
+                                continue
+
+                        try:
+                            level = self.rules.get_by_id(level_id)
+                            grade = (
+                                level.calculate_grade(result_data['value'])
+                                if level else result_data['grade']
+                            )
+                            results[result_key] = StudentStandard(
+                                id=existing_pk,
+                                student=student,
+                                standard_id=standard_id,
+                                date_recorded=date_recorded,
+                                level_id=level_id,
+                                value=result_data['value'],
+                                grade=grade
+                            )
+                        except Exception:
+                            continue
+
+        results_to_update = [result for result in results.values() if result.pk]
+        results_to_create = [result for result in results.values() if not result.pk]
+
+        if results_to_update:
+            StudentStandard.objects.bulk_update(
+                results_to_update, ['value', 'grade', 'date_recorded'], batch_size=IMPORT_BULK_BATCH_SIZE
+            )
+        if results_to_create:
+            # Мягко удаленная запись с тем же учеником, нормативом и уровнем восстанавливается
+            StudentStandard.objects.upsert(results_to_create, batch_size=IMPORT_BULK_BATCH_SIZE)
+
+        self.stats['imported_results'] += len(results_to_update) + len(results_to_create)
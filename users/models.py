@@ -1,6 +1,9 @@
 from django.contrib.auth.models import (AbstractBaseUser, BaseUserManager,
                                         PermissionsMixin)
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
 from django.db import models
+from django.utils import timezone
 
 from common.models import HumanModel
 from common.validators import ComplexPasswordValidator
@@ -102,3 +105,74 @@ class User(AbstractBaseUser, HumanModel, PermissionsMixin):
     class Meta:
         verbose_name = "Пользователь"
         verbose_name_plural = "Пользователи"
+
+
+def job_files_storage():
+    return FileSystemStorage(location=settings.JOB_FILES_ROOT)
+
+
+class Job(models.Model):
+    """Фоновая задача импорта или экспорта данных преподавателя."""
+    KIND_CHOICES = (
+        ('import_data', 'Импорт данных'),
+        ('export_xlsx', 'Экспорт в XLSX'),
+        ('qr_codes_pdf', 'PDF с QR-кодами'),
+        ('qr_codes_batch', 'QR-коды нескольких классов'),
+    )
+    STATUS_CHOICES = (
+        ('pending', 'В очереди'),
+        ('running', 'Выполняется'),
+        ('success', 'Завершена'),
+        ('failure', 'Ошибка'),
+    )
+
+    owner = models.ForeignKey(User, on_delete=models.CASCADE, related_name='jobs')
+    kind = models.CharField(max_length=32, choices=KIND_CHOICES)
+    status = models.CharField(max_length=16, choices=STATUS_CHOICES, default='pending')
+    params = models.JSONField(default=dict, blank=True)
+    progress = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True)
+    input_file = models.FileField(upload_to='input/', storage=job_files_storage, blank=True)
+    artifact = models.FileField(upload_to='artifacts/', storage=job_files_storage, blank=True)
+    artifact_name = models.CharField(max_length=255, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        verbose_name = "Фоновая задача"
+        verbose_name_plural = "Фоновые задачи"
+
+    def __str__(self):
+        return f"{self.get_kind_display()} #{self.pk} ({self.get_status_display()})"
+
+    def delete(self, *args, **kwargs):
+        """Удаляет задачу вместе с ее входным файлом и результатом."""
+        self.input_file.delete(save=False)
+        self.artifact.delete(save=False)
+        return super().delete(*args, **kwargs)
+
+    def mark_running(self):
+        self.status = 'running'
+        self.save(update_fields=['status'])
+
+    def set_progress(self, **progress):
+        self.progress = progress
+        self.save(update_fields=['progress'])
+
+    def mark_success(self, result=None, artifact=None, artifact_name=''):
+        """Завершает задачу. artifact — объект File с результатом, если он есть."""
+        self.status = 'success'
+        self.result = result
+        self.finished_at = timezone.now()
+        if artifact is not None:
+            self.artifact_name = artifact_name
+            self.artifact.save(artifact_name, artifact, save=False)
+        self.save()
+
+    def mark_failure(self, error):
+        self.status = 'failure'
+        self.error = error
+        self.finished_at = timezone.now()
+        self.save(update_fields=['status', 'error', 'finished_at'])
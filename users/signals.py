@@ -1,8 +1,12 @@
 import uuid
 
-from django.db.models.signals import post_save
+from django.db.models.signals import post_save, post_delete
 from django.dispatch import receiver
 
+from common.bulk_signals import defer_to_bulk
+from standards.models import Standard, Level, StudentStandard
+from students.models import Student, StudentClass
+from users.export_cache import bump_data_versions
 from users.models import User
 from users.utils import send_verification_email
 
@@ -14,4 +18,50 @@ def send_confirmation_email(sender, instance, created, **kwargs):
         if not instance.is_email_verified:
             instance.verification_token = uuid.uuid4()
             instance.save()
-            send_verification_email(instance)
\ No newline at end of file
+            send_verification_email(instance)
+
+
+def reset_export_cache(teacher_id):
+    """Сбрасывает кэш экспорта преподавателя, в массовых операциях — один раз на преподавателя."""
+    if not defer_to_bulk(bump_data_versions, teacher_id, teacher_id):
+        bump_data_versions([teacher_id])
+
+
+@receiver(post_delete, sender=StudentClass)
+@receiver(post_save, sender=StudentClass)
+def reset_export_cache_on_class_change(sender, instance, **kwargs):
+    """Сбрасывает кэш экспорта при изменении класса"""
+    reset_export_cache(instance.class_owner_id)
+
+
+@receiver(post_delete, sender=Student)
+@receiver(post_save, sender=Student)
+def reset_export_cache_on_student_change(sender, instance, **kwargs):
+    """Сбрасывает кэш экспорта при изменении ученика"""
+    reset_export_cache(instance.student_class.class_owner_id)
+
+
+@receiver(post_delete, sender=Standard)
+@receiver(post_save, sender=Standard)
+def reset_export_cache_on_standard_change(sender, instance, **kwargs):
+    """Сбрасывает кэш экспорта при изменении норматива"""
+    reset_export_cache(instance.who_added_id)
+
+
+@receiver(post_delete, sender=Level)
+@receiver(post_save, sender=Level)
+def reset_export_cache_on_level_change(sender, instance, **kwargs):
+    """Сбрасывает кэш экспорта при изменении уровня"""
+    try:
+        reset_export_cache(instance.standard.who_added_id)
+    except Standard.DoesNotExist:
+        # Норматив удален вместе с уровнем, кэш сброшен его обработчиком
+        pass
+
+
+@receiver(post_delete, sender=StudentStandard)
+@receiver(post_save, sender=StudentStandard)
+def reset_export_cache_on_result_change(sender, instance, **kwargs):
+    """Сбрасывает кэш экспорта при изменении результата норматива"""
+    # Норматив уже загружен при сохранении результата для расчета оценки
+    reset_export_cache(instance.standard.who_added_id)
@@ -1,7 +1,13 @@
+import tempfile
+from datetime import timedelta
+
 from celery import shared_task
 from django.conf import settings
+from django.core.files import File
 from django.core.mail import send_mail
+from django.db.models import Q
 from django.template.loader import render_to_string
+from django.utils import timezone
 from django.utils.html import strip_tags
 
 
@@ -52,4 +58,66 @@ def send_password_reset_email_task(email, full_name, reset_token):
         recipient_list=[email],
         html_message=html_message,
         fail_silently=False,
-    )
\ No newline at end of file
+    )
+
+
+@shared_task
+def import_data_job_task(job_id):
+    """Фоновый импорт данных преподавателя из загруженного JSON-файла"""
+    from users.imports import TeacherDataImporter, ImportDataError
+    from users.models import Job
+
+    job = Job.objects.select_related('owner').get(pk=job_id)
+    job.mark_running()
+
+    try:
+        with job.input_file.open('rb') as input_file:
+            stats = TeacherDataImporter(job.owner, on_progress=job.set_progress).run(input_file)
+    except ImportDataError as e:
+        job.mark_failure(str(e))
+        return
+    except Exception as e:
+        job.mark_failure(f'Ошибка при импорте данных: {str(e)}')
+        raise
+    finally:
+        job.input_file.delete()
+
+    job.mark_success(result=stats)
+
+
+@shared_task
+def export_xlsx_job_task(job_id):
+    """Фоновый экспорт данных преподавателя в XLSX"""
+    from users.exports import write_teacher_xlsx
+    from users.models import Job
+
+    job = Job.objects.select_related('owner').get(pk=job_id)
+    job.mark_running()
+
+    try:
+        with tempfile.TemporaryFile() as output:
+            write_teacher_xlsx(job.owner, output, on_progress=job.set_progress, **job.params)
+            output.seek(0)
+            job.mark_success(artifact=File(output), artifact_name='standards_export.xlsx')
+    except Exception as e:
+        job.mark_failure(f'Ошибка при экспорте данных: {str(e)}')
+        raise
+
+
+@shared_task
+def delete_expired_jobs_task():
+    """
+    Удаляет фоновые задачи, завершенные более JOB_RETENTION_DAYS дней назад, вместе с их файлами.
+    Незавершенные задачи того же возраста считаются зависшими и тоже удаляются.
+    """
+    from users.models import Job
+
+    expired_before = timezone.now() - timedelta(days=settings.JOB_RETENTION_DAYS)
+    deleted = 0
+    for job in Job.objects.filter(
+            Q(finished_at__lt=expired_before) | Q(finished_at__isnull=True, created_at__lt=expired_before)
+    ).iterator():
+        job.delete()
+        deleted += 1
+
+    return deleted